@@ -1,18 +1,45 @@
 from abc import ABCMeta, abstractmethod, ABC
 import control_panel
 import game_board
+import bit_board
+import board_feature
+import transposition_table
+import fitness_cache
+import replay_memory
+import numpy_inference
+import symmetry
 import random
 import numpy as np
 import copy
 import math
-import tensorflow as tf
-import tensorflow.keras.layers as krs_layer
-import tensorflow.keras.models as krs_models
-import tensorflow.keras.optimizers as krs_optimizers
-import tensorflow.keras.utils as krs_utils
-import tensorflow.keras.losses as krs_losses
-from collections import deque
-
+import time
+
+# TensorFlow is loaded when DQNAgent is constructed or unpickled (_load_tensorflow)
+# the other agents and worker processes of battle / learn do not need it
+tf = None
+krs_layer = None
+krs_models = None
+krs_optimizers = None
+krs_utils = None
+krs_losses = None
+
+
+def _load_tensorflow():
+    global tf, krs_layer, krs_models, krs_optimizers, krs_utils, krs_losses
+    if tf is not None:
+        return
+    import tensorflow
+    import tensorflow.keras.layers
+    import tensorflow.keras.models
+    import tensorflow.keras.optimizers
+    import tensorflow.keras.utils
+    import tensorflow.keras.losses
+    krs_layer = tensorflow.keras.layers
+    krs_models = tensorflow.keras.models
+    krs_optimizers = tensorflow.keras.optimizers
+    krs_utils = tensorflow.keras.utils
+    krs_losses = tensorflow.keras.losses
+    tf = tensorflow
 
 
 class Agent(metaclass=ABCMeta):
@@ -52,6 +79,10 @@ class Agent(metaclass=ABCMeta):
     def next_step(self):
         pass
 
+    # for BatchGameBoard, selectable_bits is uint64 array. return cell index (vertical * 8 + horizontal) array
+    def next_step_batch(self, batch_game_board, selectable_bits):
+        raise Exception("This Agent does not support BatchGameBoard.")
+
     @property
     def agent_number(self):
         return self.__agent_number
@@ -84,6 +115,15 @@ class Agent(metaclass=ABCMeta):
     def agent_name(self):
         return self.__agent_name
 
+    # for headless runner. override to False if the signal method does nothing
+    @property
+    def need_update_signal(self):
+        return True
+
+    @property
+    def need_game_end_signal(self):
+        return True
+
     def copy(self):
         return copy.deepcopy(self)
 
@@ -111,6 +151,14 @@ class RandomAgent(Agent):
     def __init__(self):
         super().__init__("random", False)
 
+    @property
+    def need_update_signal(self):
+        return False
+
+    @property
+    def need_game_end_signal(self):
+        return False
+
     def receive_update_signal(self):
         pass
 
@@ -122,6 +170,10 @@ class RandomAgent(Agent):
         index = random.randint(0, len(selectable) - 1)
         return selectable[index]
 
+    def next_step_batch(self, batch_game_board, selectable_bits):
+        selectable_matrix = bit_board.to_cell_matrix(selectable_bits)
+        return np.argmax(np.random.rand(*selectable_matrix.shape) * selectable_matrix, axis=1)
+
 
 # Learning the board
 class GABoardAgent(Agent):
@@ -129,6 +181,14 @@ class GABoardAgent(Agent):
         super().__init__("GALearning", False)
         self.__evaluation_board = np.zeros(8 * 8)
 
+    @property
+    def need_update_signal(self):
+        return False
+
+    @property
+    def need_game_end_signal(self):
+        return False
+
     def receive_game_end_signal(self):
         pass
 
@@ -202,6 +262,18 @@ class GABoardAgent(Agent):
                 now_evaluation_value = self.__get_evaluation_value(explore[0], explore[1])
         return ret
 
+    def next_step_batch(self, batch_game_board, selectable_bits):
+        selectable_matrix = bit_board.to_cell_matrix(selectable_bits)
+        return np.argmax(np.where(selectable_matrix, self.__evaluation_board, -np.inf), axis=1)
+
+    # for fitness_cache
+    def genome_key(self, context=""):
+        return fitness_cache.FitnessCache.calc_key([self.__evaluation_board], context)
+
+    # for search agent (AlphaBetaAgent etc.)
+    def evaluate_custom_board(self, agent_number, custom_reversi_board):
+        return float(np.dot(self.__evaluation_board, custom_reversi_board.reshape(64)) * agent_number)
+
     def save_evaluation_board(self, file_path):
         np.save(file_path, self.__evaluation_board)
 
@@ -210,6 +282,11 @@ class GABoardAgent(Agent):
 
 
 class QLeaningAgent(Agent):
+    # one-hot feature of each cell (white, nothing, black) and endgame flag
+    FEATURE_SIZE = 8 * 8 * 3 + 1
+    __END_FLAG_INDEX = 8 * 8 * 3
+    __CELL_INDEXES = np.arange(8 * 8)
+
     def __init__(self, is_learning):
         super().__init__("QLearning", False)
         self.__ALPHA = 0.025
@@ -217,179 +294,106 @@ class QLeaningAgent(Agent):
         self.__TEMPERATURE = 0.08
         self.__is_learning = is_learning
         self.__now_time = 1
-        # plus one is endgame flag (value)
-        self.__now_feature_vector = np.zeros(8 * 8 * 3 + 1)
-        self.__weight_vector = np.full(8 * 8 * 3 + 1, 0.05)
+        # the feature is the index set of one-hot vector (64 indexes) and endgame flag
+        self.__now_feature_indexes = np.zeros(8 * 8, dtype=np.int64)
+        self.__now_end_flag = False
+        self.__weight_vector = np.full(self.FEATURE_SIZE, 0.05)
 
-    @staticmethod
-    def __calc_index_from_board_index(agent_number, vertical_index, horizontal_index):
-        return int((agent_number + 1) * 64 + vertical_index * 8 + horizontal_index)
+    @property
+    def need_update_signal(self):
+        return self.__is_learning
 
-    @staticmethod
-    def __convert_feature_vector_to_board(feature_vector):
-        ret = np.zeros(8 * 8).reshape(8, 8)
-        for agent_number in [-1, 1]:
-            for vertical_index in range(0, 8):
-                for horizontal_index in range(0, 8):
-                    if feature_vector[
-                        QLeaningAgent.__calc_index_from_board_index(
-                            agent_number,
-                            vertical_index,
-                            horizontal_index
-                        )
-                    ] == 1:
-                        ret[vertical_index][horizontal_index] = agent_number
-        return ret
+    @property
+    def need_game_end_signal(self):
+        return self.__is_learning
 
     @staticmethod
-    def __convert_board_to_feature_vector(board):
-        ret = np.zeros(8 * 8 * 3 + 1)
-        for vertical_index in range(0, 8):
-            for horizontal_index in range(0, 8):
-                ret[
-                    QLeaningAgent.__calc_index_from_board_index(
-                        board[vertical_index][horizontal_index],
-                        vertical_index,
-                        horizontal_index
-                    )
-                ] = 1
-        return ret
+    def __convert_board_to_feature_indexes(board):
+        return ((np.asarray(board).reshape(64) + 1) * 64).astype(np.int64) + QLeaningAgent.__CELL_INDEXES
 
+    # change_bits_list is put cell and flips of each move. return feature index matrix (one row per move)
     @staticmethod
-    def __calc_custom_q_value(gravity_vector, feature_vector):
-        ret = 0
-        for gravity, feature in zip(gravity_vector, feature_vector):
-            ret += feature * gravity
-        return ret
+    def __apply_change_bits(feature_indexes, change_bits_list, agent_number):
+        change_matrix = bit_board.to_cell_matrix(np.array(change_bits_list, dtype=np.uint64))
+        return np.where(change_matrix, (agent_number + 1) * 64 + QLeaningAgent.__CELL_INDEXES, feature_indexes)
 
-    def __calc_custom_q_value_not_change(self, agent_number, action, weight_vector, feature_vector):
-        reversi_board = self.__convert_feature_vector_to_board(feature_vector)
-        game_board.GameBoard.put_stone_custom_board(action[0], action[1], agent_number, reversi_board)
-        ret = self.__calc_custom_q_value(
-            weight_vector,
-            self.__convert_board_to_feature_vector(reversi_board)
-        )
-        return ret
+    # return (feature index matrix, list of (player bits, opponent bits) after each move)
+    @staticmethod
+    def __expand_moves(feature_indexes, moves, player, opponent, agent_number):
+        change_bits_list = []
+        next_bits_list = []
+        for index in moves:
+            flips = bit_board.get_flips(index, player, opponent)
+            change_bits_list.append(flips | (1 << index))
+            next_bits_list.append((player | flips | (1 << index), opponent & ~flips))
+        return QLeaningAgent.__apply_change_bits(feature_indexes, change_bits_list, agent_number), next_bits_list
+
+    def __calc_q_values(self, feature_index_matrix):
+        return self.__weight_vector[feature_index_matrix].sum(axis=1)
 
-    def __calc_game_end_q_value_not_change(self, weight_vector, feature_vector):
-        feature_vector[8 * 8 * 3] = 1
-        ret = self.__calc_custom_q_value(weight_vector, feature_vector)
-        feature_vector[8 * 8 * 3] = 0
+    def calc_now_q_value(self):
+        ret = self.__weight_vector[self.__now_feature_indexes].sum()
+        if self.__now_end_flag:
+            ret += self.__weight_vector[self.__END_FLAG_INDEX]
         return ret
 
-    # action require tuple
-    def __calc_action_q_value(self, action):
-        return self.__calc_custom_q_value_not_change(self.agent_number, action, self.__weight_vector,
-                                                     self.__now_feature_vector)
-
-    def calc_now_q_value(self):
-        return self.__calc_custom_q_value(self.__weight_vector, self.__now_feature_vector)
+    # Q value of each action from now feature
+    def __calc_action_q_values(self, selectable_cells):
+        player, opponent = self.belong_game_board.get_bits(self.agent_number)
+        moves = [int(cell[0]) * 8 + int(cell[1]) for cell in selectable_cells]
+        feature_index_matrix = self.__expand_moves(self.__now_feature_indexes, moves, player, opponent,
+                                                   self.agent_number)[0]
+        return self.__calc_q_values(feature_index_matrix)
+
+    # max Q value of my action after each enemy action (2-ply)
+    def __calc_next_max_q_value(self):
+        player, opponent = self.belong_game_board.get_bits(self.agent_number)
+        enemy_moves = bit_board.to_indexes(bit_board.get_moves(opponent, player))
+        if len(enemy_moves) == 0:
+            enemy_states = [(self.__now_feature_indexes, player, opponent)]
+        else:
+            enemy_matrix, enemy_bits_list = self.__expand_moves(self.__now_feature_indexes, enemy_moves, opponent,
+                                                                player, self.agent_number * -1)
+            enemy_states = [
+                (enemy_feature_indexes, enemy_bits[1], enemy_bits[0])
+                for enemy_feature_indexes, enemy_bits in zip(enemy_matrix, enemy_bits_list)
+            ]
+        leaf_matrix_list = []
+        for feature_indexes, now_player, now_opponent in enemy_states:
+            my_moves = bit_board.to_indexes(bit_board.get_moves(now_player, now_opponent))
+            if len(my_moves) != 0:
+                leaf_matrix_list.append(self.__expand_moves(feature_indexes, my_moves, now_player, now_opponent,
+                                                            self.agent_number)[0])
+        if len(leaf_matrix_list) == 0:
+            return 0
+        return max(0, float(self.__calc_q_values(np.concatenate(leaf_matrix_list)).max()))
 
     # after exec next step (exec in receive?*_signal)
     def __update_gravity_vector(self, reward, is_game_end):
-        max_value = 0
-        enemy_selectable = self.belong_game_board.get_selectable_cells(self.agent_number * -1)
-        next_feature_vector = copy.deepcopy(self.__now_feature_vector)
-        reversi_board = copy.deepcopy(self.belong_game_board.reversi_board)
-
-        def update_max_value(agent_number, action):
-            nonlocal max_value, reversi_board
-            my_change_cells = game_board.GameBoard.put_stone_custom_board(
-                action[0],
-                action[1],
-                self.agent_number,
-                reversi_board
-            )
-            max_value = max(
-                max_value,
-                self.__calc_custom_q_value_not_change(
-                    agent_number,
-                    action,
-                    self.__weight_vector,
-                    self.__convert_board_to_feature_vector(reversi_board)
-                )
-            )
-            reversi_board[my_change_cells[0][0]][my_change_cells[0][1]] = 0
-            for my_cell in my_change_cells[1:]:
-                reversi_board[my_cell[0]][my_cell[1]] *= -1
-
         if is_game_end:
-            max_value = max(
-                max_value,
-                self.__calc_game_end_q_value_not_change(
-                    self.__weight_vector,
-                    next_feature_vector
-                )
-            )
+            max_value = max(0, self.calc_now_q_value())
         else:
-            for enemy in enemy_selectable:
-                change_cells = game_board.GameBoard.put_stone_custom_board(
-                    enemy[0],
-                    enemy[1],
-                    self.agent_number * -1,
-                    reversi_board
-                )
-                next_my_selectable = game_board.GameBoard.get_selectable_cells_custom_board(
-                    self.agent_number,
-                    reversi_board
-                )
-                for my in next_my_selectable:
-                    update_max_value(self.agent_number, my)
-                reversi_board[change_cells[0][0]][change_cells[0][1]] = 0
-                for enemy_cell in change_cells[1:]:
-                    reversi_board[enemy_cell[0]][enemy_cell[1]] *= -1
-            if len(enemy_selectable) == 0:
-                next_my_selectable = game_board.GameBoard.get_selectable_cells_custom_board(
-                    self.agent_number,
-                    reversi_board
-                )
-                for my in next_my_selectable:
-                    update_max_value(self.agent_number, my)
-        now_value = self.calc_now_q_value()
-
-        def calc(inner_index):
-            nonlocal max_value, now_value, reward
-            inner_value = (reward + self.__GAMMA * max_value - now_value)
-            inner_value *= self.__now_feature_vector[inner_index]
-            return self.__weight_vector[inner_index] + self.__ALPHA * inner_value
-
-        np.set_printoptions(suppress=True)
-        next_weight_vector = np.zeros(8 * 8 * 3 + 1)
-
-        for index in range(0, 8 * 8 * 3 + 1):
-            next_weight_vector[index] = calc(index)
-        self.__weight_vector = next_weight_vector
+            max_value = self.__calc_next_max_q_value()
+        difference = self.__ALPHA * (reward + self.__GAMMA * max_value - self.calc_now_q_value())
+        # indexes of one-hot feature are unique
+        self.__weight_vector[self.__now_feature_indexes] += difference
+        if self.__now_end_flag:
+            self.__weight_vector[self.__END_FLAG_INDEX] += difference
 
     def __get_boltzmann_select(self):
         selectable_cells = self.belong_game_board.get_selectable_cells(self.agent_number)
-        base_value = 0
-        max_q_value = -1000000
-        for cell in selectable_cells:
-            max_q_value = max(max_q_value, self.__calc_action_q_value(cell) / self.__TEMPERATURE)
-        for cell in selectable_cells:
-            base_value += math.exp(self.__calc_action_q_value(cell) / self.__TEMPERATURE - max_q_value)
-        sum_value = 0
-        probability = []
-        for cell in selectable_cells:
-            sum_value += (math.exp(self.__calc_action_q_value(cell) / self.__TEMPERATURE - max_q_value)) / base_value
-            probability.append(sum_value)
-        probability[-1] = 1
-        select_value = random.random()
-        for index, value in enumerate(probability):
-            if probability[index] < select_value:
-                return selectable_cells[index]
-        return selectable_cells[-1]
+        q_values = self.__calc_action_q_values(selectable_cells) / self.__TEMPERATURE
+        probability = np.exp(q_values - q_values.max())
+        probability /= probability.sum()
+        return selectable_cells[np.random.choice(len(selectable_cells), p=probability)]
 
     def __get_best_move(self):
         selectable_cells = self.belong_game_board.get_selectable_cells(self.agent_number)
-        ret = selectable_cells[0]
-        max_value = -100
-        for cell in selectable_cells:
-            now_value = self.__calc_action_q_value(cell)
-            if max_value < now_value:
-                ret = cell
-                max_value = now_value
-        return ret
+        return selectable_cells[int(np.argmax(self.__calc_action_q_values(selectable_cells)))]
+
+    def __update_now_feature(self):
+        self.__now_feature_indexes = self.__convert_board_to_feature_indexes(self.belong_game_board.reversi_board)
+        self.__now_end_flag = False
 
     def time_increment(self):
         self.__now_time += 1
@@ -398,18 +402,18 @@ class QLeaningAgent(Agent):
         if not self.__is_learning:
             return
         if self.belong_game_board.turn_agent_number == 0:
-            self.__now_feature_vector = self.__convert_board_to_feature_vector(self.belong_game_board.reversi_board)
+            self.__update_now_feature()
             return
         if self.agent_number != self.belong_game_board.turn_agent_number:
             return
-        self.__now_feature_vector = self.__convert_board_to_feature_vector(self.belong_game_board.reversi_board)
+        self.__update_now_feature()
         self.__update_gravity_vector(0, False)
 
     # -1, 0, 1
     def receive_game_end_signal(self):
         if not self.__is_learning:
             return
-        self.__now_feature_vector[8 * 8 * 3] = 1
+        self.__now_end_flag = True
         result = self.belong_game_board.check_game_end()
         if result == 2:
             result = 0
@@ -419,22 +423,35 @@ class QLeaningAgent(Agent):
         self.__update_gravity_vector(result, True)
 
     def next_step(self):
+        self.__update_now_feature()
         if self.__is_learning:
-            self.__now_feature_vector = self.__convert_board_to_feature_vector(self.belong_game_board.reversi_board)
             return self.__get_boltzmann_select()
         else:
-            self.__now_feature_vector = self.__convert_board_to_feature_vector(self.belong_game_board.reversi_board)
             return self.__get_best_move()
 
     def save_weight_vector(self, file_path):
         np.save(file_path, self.__weight_vector)
 
     def load_weight_vector(self, file_path):
-        self.__weight_vector = np.load(file_path)
+        self.__weight_vector = np.load(file_path).astype(np.float64)
+
+    # Read Only (updated in place while learning)
+    @property
+    def weight_vector(self):
+        return self.__weight_vector
+
+    # not copied, the agent updates the given array in place (for shared memory)
+    def set_weight_vector(self, weight_vector):
+        if weight_vector.shape != (self.FEATURE_SIZE,) or weight_vector.dtype != np.float64:
+            raise Exception("Weight vector must be float64 array of " + str(self.FEATURE_SIZE) + " elements.")
+        self.__weight_vector = weight_vector
 
 
 # is_ReLU is True Relu, False is sigmoid
 class NeuralNetworkGALeaningAgent(Agent):
+    # corner, stones, center, mobility, X-square (input of 8 nodes)
+    __FEATURE_EXTRACTOR = board_feature.FeatureExtractor(board_feature.NNGA_FEATURES)
+
     def __init__(self, is_ReLU):
         super().__init__("NNGA", False)
         self.__is_ReLU = is_ReLU
@@ -445,6 +462,15 @@ class NeuralNetworkGALeaningAgent(Agent):
             self.__input_weight = 2 * np.random.rand(8, 15) - 1
             self.__output_weight = 2 * np.random.rand(15, 1) - 1
 
+    # next_step does not use the vector of receive_update_signal
+    @property
+    def need_update_signal(self):
+        return False
+
+    @property
+    def need_game_end_signal(self):
+        return False
+
     # under about Neural Network
     @staticmethod
     def sigmoid(x):
@@ -454,58 +480,26 @@ class NeuralNetworkGALeaningAgent(Agent):
     def ReLU(x):
         return np.maximum(0, x)
 
-    # forward propagation
-    def forward(self):
-        # input layer
-        now_layer = copy.deepcopy(self.__now_vector)
+    # forward propagation of each row of vectors
+    def __forward_batch(self, vectors):
         # first middle layer
-        now_layer = np.dot(now_layer, self.__input_weight)
+        now_layer = np.dot(vectors, self.__input_weight)
         if self.__is_ReLU:
             now_layer = self.ReLU(now_layer)
         else:
             now_layer = self.sigmoid(now_layer)
         # output layer
         now_layer = np.dot(now_layer, self.__output_weight)
-        return now_layer[0]
+        return now_layer[:, 0]
 
-    # end Neural Network
+    # forward propagation
+    def forward(self):
+        return self.__forward_batch(self.__now_vector.reshape(1, -1))[0]
 
-    @staticmethod
-    def __generate_vector_from_custom_board(agent_number, custom_reversi_board):
-        ret = np.zeros(8)
-        my_count = 0
-        enemy_count = 0
-
-        def specific_count_stone(vertical_array, horizontal_array):
-            nonlocal my_count, enemy_count
-            my_count = 0
-            enemy_count = 0
-            for vertical_index in vertical_array:
-                for horizontal_index in horizontal_array:
-                    if custom_reversi_board[vertical_index][horizontal_index] == agent_number:
-                        my_count += 1
-                    elif custom_reversi_board[vertical_index][horizontal_index] == agent_number * -1:
-                        enemy_count += 1
-
-        specific_count_stone([0, 7], [0, 7])
-        ret[0] = my_count
-        ret[1] = enemy_count
-        ret[2] = game_board.GameBoard.count_stones_custom_board(agent_number, custom_reversi_board)
-        ret[3] = game_board.GameBoard.count_stones_custom_board(agent_number * -1, custom_reversi_board)
-        specific_count_stone([3, 4], [3, 4])
-        ret[4] = my_count - enemy_count
-        specific_count_stone([2, 3, 4, 5], [2, 3, 4, 5])
-        ret[5] = my_count - enemy_count
-        ret[6] = len(game_board.GameBoard.get_selectable_cells_custom_board(agent_number * -1, custom_reversi_board))
-        specific_count_stone([1, 6], [1, 6])
-        ret[7] = my_count - enemy_count
-        return ret
+    # end Neural Network
 
     def __update_vector(self):
-        self.__now_vector = self.__generate_vector_from_custom_board(
-            self.agent_number,
-            self.belong_game_board.reversi_board
-        )
+        self.__now_vector = self.__FEATURE_EXTRACTOR.extract(self.agent_number, self.belong_game_board.reversi_board)
 
     def receive_update_signal(self):
         self.__update_vector()
@@ -515,32 +509,38 @@ class NeuralNetworkGALeaningAgent(Agent):
 
     def next_step(self):
         selectable_cells = self.belong_game_board.get_selectable_cells(self.agent_number)
-        ret = 0
-        max_value = -10000
-        reversi_board = copy.deepcopy(self.belong_game_board.reversi_board)
-        for index, cell in enumerate(selectable_cells):
-            change_cells = game_board.GameBoard.put_stone_custom_board(
-                cell[0],
-                cell[1],
-                self.agent_number,
-                reversi_board
-            )
-            self.__now_vector = self.__generate_vector_from_custom_board(
-                self.agent_number,
-                reversi_board
-            )
-            calc_value = self.forward()
-            if max_value < calc_value:
-                ret = index
-                max_value = calc_value
-            reversi_board[change_cells[0][0], change_cells[0][1]] = 0
-            for change_cell in change_cells[1:]:
-                reversi_board[change_cell[0]][change_cell[1]] = self.agent_number * -1
-        return selectable_cells[ret]
+        player, opponent = self.belong_game_board.get_bits(self.agent_number)
+        player = np.full(len(selectable_cells), player, dtype=np.uint64)
+        opponent = np.full(len(selectable_cells), opponent, dtype=np.uint64)
+        put_indexes = selectable_cells[:, 0] * 8 + selectable_cells[:, 1]
+        flips, put_bits = bit_board.get_flips_array(put_indexes, player, opponent)
+        calc_values = self.__forward_batch(self.__FEATURE_EXTRACTOR.extract_bits_array(
+            player | flips | put_bits,
+            opponent & ~flips
+        ))
+        return selectable_cells[int(np.argmax(calc_values))]
+
+    # for search agent (AlphaBetaAgent etc.)
+    def evaluate_custom_board(self, agent_number, custom_reversi_board):
+        self.__now_vector = self.__FEATURE_EXTRACTOR.extract(agent_number, custom_reversi_board)
+        return self.forward()
+
+    # evaluate boards (shape is (N, 8, 8)) with one forward propagation. agent_number is None: own agent number
+    def evaluate_batch(self, custom_reversi_boards, agent_number=None):
+        if agent_number is None:
+            agent_number = self.agent_number
+        return self.__forward_batch(self.__FEATURE_EXTRACTOR.extract_batch(agent_number, custom_reversi_boards))
 
     def __get_all_weight_array(self):
         return [self.__input_weight, self.__output_weight]
 
+    # for fitness_cache
+    def genome_key(self, context=""):
+        return fitness_cache.FitnessCache.calc_key(
+            self.__get_all_weight_array() + [np.array([self.__is_ReLU])],
+            context
+        )
+
     def cross_over_one_point(self, add_agent):
         ret = NeuralNetworkGALeaningAgent(self.__is_ReLU)
         if not isinstance(add_agent, NeuralNetworkGALeaningAgent):
@@ -601,6 +601,7 @@ class NeuralNetworkGALeaningAgent(Agent):
 class DQNAgent(Agent):
     @staticmethod
     def __generate_model():
+        _load_tensorflow()
         now_state_input = krs_layer.Input(shape=(8, 8, 1))
         action_state_input = krs_layer.Input(shape=(8, 8, 1))
         now_state_conv = krs_layer.Conv2D(32, (5, 5), strides=(2, 2), activation="relu", padding="same")(now_state_input)
@@ -617,16 +618,23 @@ class DQNAgent(Agent):
 
     @staticmethod
     def get_model_picture(file_path):
+        _load_tensorflow()
         krs_utils.plot_model(DQNAgent.__generate_model(), file_path, show_shapes=True)
 
     @staticmethod
     def setting_gpu():
+        _load_tensorflow()
         physical_devices = tf.config.experimental.list_physical_devices('GPU')
         if len(physical_devices) > 0:
             for k in range(len(physical_devices)):
                 tf.config.experimental.set_memory_growth(physical_devices[k], True)
 
-    def __init__(self, is_learning, batch_size=None, epsilon=None, gamma=None):
+    # memory is ReplayMemory or PrioritizedReplayMemory (default is ReplayMemory of 2 * batch_size)
+    # is_training is False: only save transitions to memory (actor of learn.ParallelDQNLearning)
+    # is_augmented is True: save 8 symmetric transitions of each transition (default memory is 8 times larger)
+    def __init__(self, is_learning, batch_size=None, epsilon=None, gamma=None, memory=None, is_training=True,
+                 is_augmented=False):
+        _load_tensorflow()
         self.setting_gpu()
         super().__init__("DQN", False)
         self.__q_network = self.__generate_model()  # q_network
@@ -635,134 +643,173 @@ class DQNAgent(Agent):
         self.__EPSILON = epsilon
         self.__GAMMA = gamma
         self.__BATCH_SIZE = batch_size
-        self.__before_reversi_board = None
-        self.__replay_data = deque()
+        self.__before_reversi_board = np.zeros(8 * 8).reshape(8, 8)
+        if memory is None:
+            capacity = 2 * batch_size if batch_size is not None else 1
+            if is_augmented:
+                capacity *= symmetry.NUMBER_SYMMETRIES
+            memory = replay_memory.ReplayMemory(capacity)
+        self.__replay_memory = memory
+        self.__is_training = is_training
+        self.__is_augmented = is_augmented
+        self.__search_board = game_board.SearchBoard()
+        self.__now_state_buffer = np.zeros((0, 8, 8), dtype=np.float32)
+        self.__action_state_buffer = np.zeros((0, 8, 8), dtype=np.float32)
+        self.__reserve_input_buffer(64)
+
+    # unpickle (the networks need TensorFlow)
+    def __setstate__(self, state):
+        _load_tensorflow()
+        self.__dict__.update(state)
 
-    def __get_q_value(self, now_state_input, action_state_input):
-        first = np.array(now_state_input)
-        first = first.reshape((1, 8, 8))
-        second = np.array(action_state_input)
-        second = second.reshape((1, 8, 8))
-        return self.__t_network.predict_on_batch([first, second])[0]
+    @property
+    def need_update_signal(self):
+        return self.__is_learning
 
-    def __train_model(self, state_batch, calc_batch):
-        self.__q_network.train_on_batch(state_batch, calc_batch)
+    @property
+    def need_game_end_signal(self):
+        return self.__is_learning
+
+    # input pairs of (now state, action state) for one inference call, keep the content when it grows
+    def __reserve_input_buffer(self, size):
+        if size <= len(self.__now_state_buffer):
+            return
+        add_shape = (max(size, 2 * len(self.__now_state_buffer)) - len(self.__now_state_buffer), 8, 8)
+        self.__now_state_buffer = np.concatenate([self.__now_state_buffer, np.zeros(add_shape, dtype=np.float32)])
+        self.__action_state_buffer = np.concatenate([self.__action_state_buffer, np.zeros(add_shape, dtype=np.float32)])
+
+    # Q values of the first size pairs of input buffer
+    def __get_q_values(self, size):
+        return np.asarray(self.__t_network.predict_on_batch([
+            self.__now_state_buffer[:size],
+            self.__action_state_buffer[:size]
+        ])).reshape(-1)
+
+    def __train_model(self):
+        if not self.__is_training or len(self.__replay_memory) < self.__BATCH_SIZE:
+            return False
+        if isinstance(self.__replay_memory, replay_memory.PrioritizedReplayMemory):
+            indexes, state_batch, update_value, weights = self.__replay_memory.sample(self.__BATCH_SIZE)
+            td_errors = update_value - np.asarray(self.__q_network.predict_on_batch(state_batch)).reshape(-1)
+            self.__q_network.train_on_batch(state_batch, update_value, sample_weight=weights)
+            self.__replay_memory.update_priorities(indexes, td_errors)
+        else:
+            indexes, state_batch, update_value = self.__replay_memory.sample(self.__BATCH_SIZE)
+            self.__q_network.train_on_batch(state_batch, update_value)
+        return True
+
+    # one training step of q network from replay memory. return False if memory is not enough
+    def train_step(self):
+        return self.__train_model()
+
+    @property
+    def replay_memory(self):
+        return self.__replay_memory
 
     # From the state this agent was in.
     def __get_next_state_max_q_value(self, now_game_board):
-        enemy_selectable_cells = game_board.GameBoard.get_selectable_cells_custom_board(
-            self.agent_number * -1,
-            now_game_board
-        )
-        accumulation_q_value = []
-
-        def my_selectable_calc(enemy_game_board):
-            nonlocal accumulation_q_value
-            my_selectable_cells = game_board.GameBoard.get_selectable_cells_custom_board(
-                self.agent_number,
-                enemy_game_board
-            )
+        search_board = self.__search_board
+        search_board.reset(now_game_board)
+        size = 0
+
+        def my_selectable_calc():
+            nonlocal size
+            my_selectable_cells = search_board.get_selectable_cells(self.agent_number)
+            count = max(1, len(my_selectable_cells))
+            self.__reserve_input_buffer(size + count)
+            self.__now_state_buffer[size:size + count] = search_board.reversi_board
             if len(my_selectable_cells) == 0:
-                accumulation_q_value.append(self.__get_q_value(enemy_game_board, enemy_game_board))
+                self.__action_state_buffer[size] = search_board.reversi_board
             else:
-                next_game_board = copy.deepcopy(now_game_board)
-                for my_select_cell in my_selectable_cells:
-                    my_change_cells = game_board.GameBoard.put_stone_custom_board(
-                        my_select_cell[0],
-                        my_select_cell[1],
-                        self.agent_number,
-                        next_game_board
-                    )
-                    accumulation_q_value.append(self.__get_q_value(enemy_game_board, next_game_board))
-                    game_board.GameBoard.undo_put_stone_custom_board(my_change_cells, next_game_board)
+                self.__action_state_buffer[size:size + count] = search_board.get_next_reversi_boards(
+                    my_selectable_cells,
+                    self.agent_number
+                )
+            size += count
 
+        enemy_selectable_cells = search_board.get_selectable_cells(self.agent_number * -1)
         if len(enemy_selectable_cells) == 0:
-            my_selectable_calc(now_game_board)
+            my_selectable_calc()
         else:
             for enemy_select_cell in enemy_selectable_cells:
-                change_cells = game_board.GameBoard.put_stone_custom_board(
-                    enemy_select_cell[0],
-                    enemy_select_cell[1],
-                    self.agent_number,
-                    now_game_board
-                )
-                my_selectable_calc(now_game_board)
-                game_board.GameBoard.undo_put_stone_custom_board(change_cells, now_game_board)
-        return max(accumulation_q_value)
+                search_board.make_move(enemy_select_cell[0], enemy_select_cell[1], self.agent_number * -1)
+                my_selectable_calc()
+                search_board.unmake_move()
+        return float(self.__get_q_values(size).max())
 
     def __get_action(self, epsilon):
         my_selectable_cells = self.belong_game_board.get_selectable_cells(self.agent_number)
         if random.random() < epsilon:
             return my_selectable_cells[random.randint(0, len(my_selectable_cells) - 1)]
-        next_game_board = copy.deepcopy(self.belong_game_board.reversi_board)
-        ret = 0
-        max_value = -1000
-        for index, select_cell in enumerate(my_selectable_cells):
-            change_cells = game_board.GameBoard.put_stone_custom_board(
-                select_cell[0],
-                select_cell[1],
-                self.agent_number,
-                next_game_board
-            )
-            now_value = self.__get_q_value(
-                self.belong_game_board.reversi_board,
-                next_game_board
-            )[0]
-            if max_value < now_value:
-                ret = index
-                max_value = now_value
-            game_board.GameBoard.undo_put_stone_custom_board(change_cells, next_game_board)
-        return my_selectable_cells[ret]
+        size = len(my_selectable_cells)
+        self.__reserve_input_buffer(size)
+        self.__search_board.reset(self.belong_game_board.reversi_board)
+        self.__now_state_buffer[:size] = self.belong_game_board.reversi_board
+        self.__action_state_buffer[:size] = self.__search_board.get_next_reversi_boards(
+            my_selectable_cells,
+            self.agent_number
+        )
+        return my_selectable_cells[int(np.argmax(self.__get_q_values(size)))]
 
     def __save_action(self, reward):
-        if len(self.__replay_data) == self.__BATCH_SIZE * 2:
-            self.__replay_data.popleft()
-        max_value = self.__get_next_state_max_q_value(copy.deepcopy(self.belong_game_board.reversi_board))
+        max_value = self.__get_next_state_max_q_value(self.belong_game_board.reversi_board)
         update_value = reward + self.__GAMMA * max_value
-        self.__replay_data.append(
-            [
-                np.array(self.__before_reversi_board),
-                np.array(self.belong_game_board.reversi_board),
-                update_value
-            ]
-        )
-
-    def __generate_batch(self):
-        batch_data = random.sample(self.__replay_data, self.__BATCH_SIZE)
-        first_batch, second_batch, update_value = map(np.array, zip(*batch_data))
-        state_batch = [first_batch, second_batch]
-        return state_batch, update_value
+        if self.__is_augmented:
+            self.__replay_memory.add_batch(*symmetry.augment_transitions(
+                self.__before_reversi_board,
+                self.belong_game_board.reversi_board,
+                [update_value]
+            ))
+        else:
+            self.__replay_memory.add(self.__before_reversi_board, self.belong_game_board.reversi_board, update_value)
 
     def receive_update_signal(self):
         if not self.__is_learning:
             return
         if self.belong_game_board.turn_agent_number == self.agent_number:
             self.__save_action(0)
-            if len(self.__replay_data) < self.__BATCH_SIZE:
-                return
-            state_batch, update_value = self.__generate_batch()
-            self.__train_model(state_batch, update_value)
+            self.__train_model()
 
     def receive_game_end_signal(self):
         if not self.__is_learning:
             return 
-        self.__before_reversi_board = copy.deepcopy(self.belong_game_board.reversi_board)
+        np.copyto(self.__before_reversi_board, self.belong_game_board.reversi_board)
         if self.belong_game_board.check_game_end() == self.agent_number:
             self.__save_action(1)
         elif self.belong_game_board.check_game_end() == 2:
             self.__save_action(0)
         else:
             self.__save_action(-1)
-        state_batch, update_value = self.__generate_batch()
-        self.__train_model(state_batch, update_value)
+        self.__train_model()
 
     def next_step(self):
-        self.__before_reversi_board = copy.deepcopy(self.belong_game_board.reversi_board)
+        np.copyto(self.__before_reversi_board, self.belong_game_board.reversi_board)
         return self.__get_action(self.__EPSILON if self.__is_learning else 0)
 
-    def weight_copy(self):
-        self.__q_network.save_weights("temp.hdf5")
-        self.__t_network.load_weights("temp.hdf5")
+    # target network <- q network. tau is not None: soft update (tau * q network + (1 - tau) * target network)
+    def weight_copy(self, tau=None):
+        if tau is None:
+            self.__t_network.set_weights(self.__q_network.get_weights())
+            return
+        self.__t_network.set_weights([
+            tau * q_weight + (1 - tau) * t_weight
+            for q_weight, t_weight in zip(self.__q_network.get_weights(), self.__t_network.get_weights())
+        ])
+
+    # weights of target network (list of numpy arrays)
+    def get_weights(self):
+        return self.__t_network.get_weights()
+
+    def set_weights(self, weights):
+        self.__t_network.set_weights(weights)
+
+    # same file as save (for checkpoint.CheckpointManager, use own model in the writer thread)
+    @staticmethod
+    def write_model(file_path, weights):
+        model = DQNAgent.__generate_model()
+        model.set_weights(weights)
+        model.save(file_path + ".h5")
+        return [file_path + ".h5"]
 
     def save_weight(self, file_path):
         self.__t_network.save_weights(file_path + ".h5")
@@ -776,7 +823,275 @@ class DQNAgent(Agent):
     def load(self, file_path):
         self.__t_network = krs_models.load_model(file_path + ".h5")
 
+    # weight file of NumpyDQNAgent (target network)
+    def export_numpy_weights(self, file_path):
+        numpy_inference.save_dqn_weights(file_path, self.__t_network.get_weights())
+
     def copy(self):
         ret = DQNAgent(self.__is_learning, self.__BATCH_SIZE, self.__EPSILON, self.__GAMMA)
         ret.__t_network.set_weights(self.__t_network.get_weights())
         return ret
+
+
+# DQNAgent for evaluation without TensorFlow (file of DQNAgent.export_numpy_weights)
+class NumpyDQNAgent(Agent):
+    def __init__(self, file_path=None, weights=None):
+        super().__init__("NumpyDQN", False)
+        if weights is None:
+            if file_path is None:
+                raise Exception("Select file path or weights of NumpyDQNAgent.")
+            weights = numpy_inference.load_dqn_weights(file_path)
+        self.__network = numpy_inference.DQNInferenceNetwork(weights)
+        self.__search_board = game_board.SearchBoard()
+
+    @property
+    def need_update_signal(self):
+        return False
+
+    @property
+    def need_game_end_signal(self):
+        return False
+
+    def receive_update_signal(self):
+        pass
+
+    def receive_game_end_signal(self):
+        pass
+
+    # states shape is (N, 8, 8). return Q values (N,)
+    def predict(self, now_states, action_states):
+        return self.__network.predict(now_states, action_states)
+
+    def next_step(self):
+        my_selectable_cells = self.belong_game_board.get_selectable_cells(self.agent_number)
+        self.__search_board.reset(self.belong_game_board.reversi_board)
+        q_values = self.__network.predict(
+            np.broadcast_to(self.belong_game_board.reversi_board, (len(my_selectable_cells), 8, 8)),
+            self.__search_board.get_next_reversi_boards(my_selectable_cells, self.agent_number)
+        )
+        return my_selectable_cells[int(np.argmax(q_values))]
+
+
+# Base of Agent which plays instead of the wrapped agent in some positions (opening book, endgame solver, etc.)
+# the board, agent number and signals are passed to the wrapped agent
+class WrapperAgent(Agent):
+    def __init__(self, name_prefix, wrapped_agent):
+        super().__init__(name_prefix + wrapped_agent.__class__.__name__, False)
+        self.__wrapped_agent = wrapped_agent
+
+    @property
+    def belong_game_board(self):
+        return Agent.belong_game_board.fget(self)
+
+    @belong_game_board.setter
+    def belong_game_board(self, value):
+        Agent.belong_game_board.fset(self, value)
+        self.__wrapped_agent.belong_game_board = value
+
+    @property
+    def agent_number(self):
+        return Agent.agent_number.fget(self)
+
+    @agent_number.setter
+    def agent_number(self, value):
+        Agent.agent_number.fset(self, value)
+        self.__wrapped_agent.agent_number = value
+
+    @property
+    def need_update_signal(self):
+        return self.__wrapped_agent.need_update_signal
+
+    @property
+    def need_game_end_signal(self):
+        return self.__wrapped_agent.need_game_end_signal
+
+    def receive_update_signal(self):
+        self.__wrapped_agent.receive_update_signal()
+
+    def receive_game_end_signal(self):
+        self.__wrapped_agent.receive_game_end_signal()
+
+    @property
+    def wrapped_agent(self):
+        return self.__wrapped_agent
+
+
+class SearchTimeoutException(Exception):
+    pass
+
+
+# negamax alpha-beta search with iterative deepening
+# evaluator(agent_number, custom_reversi_board) is the value from agent_number side (default is stone difference)
+class AlphaBetaAgent(Agent):
+    # search order of cells (corner first, X-square last)
+    CELL_PRIORITY = np.array([
+        0, 4, 1, 2, 2, 1, 4, 0,
+        4, 5, 3, 3, 3, 3, 5, 4,
+        1, 3, 2, 2, 2, 2, 3, 1,
+        2, 3, 2, 2, 2, 2, 3, 2,
+        2, 3, 2, 2, 2, 2, 3, 2,
+        1, 3, 2, 2, 2, 2, 3, 1,
+        4, 5, 3, 3, 3, 3, 5, 4,
+        0, 4, 1, 2, 2, 1, 4, 0,
+    ])
+    WIN_VALUE = 1000000
+
+    def __init__(self, evaluator=None, time_limit=1.0, max_depth=60, table_size=2 ** 18):
+        super().__init__("AlphaBeta", False)
+        self.__evaluator = evaluator
+        self.__TIME_LIMIT = time_limit
+        self.__MAX_DEPTH = max_depth
+        self.__transposition_table = transposition_table.TranspositionTable(table_size)
+        self.__evaluation_board = np.zeros(8 * 8).reshape(8, 8)
+        self.__deadline = 0.0
+        self.__node_count = 0
+        self.__searched_depth = 0
+
+    @property
+    def need_update_signal(self):
+        return False
+
+    @property
+    def need_game_end_signal(self):
+        return False
+
+    @staticmethod
+    def stone_difference_evaluator(agent_number, custom_reversi_board):
+        return float(np.sum(custom_reversi_board) * agent_number)
+
+    def receive_update_signal(self):
+        pass
+
+    def receive_game_end_signal(self):
+        pass
+
+    def __order_moves(self, moves_bits, best_move):
+        indexes = bit_board.to_indexes(moves_bits)
+        indexes.sort(key=lambda index: self.CELL_PRIORITY[index])
+        if best_move in indexes:
+            indexes.remove(best_move)
+            indexes.insert(0, best_move)
+        return indexes
+
+    def __evaluate(self, agent_number, player, opponent):
+        bit_board.to_reversi_board(agent_number, player, opponent, self.__evaluation_board)
+        if self.__evaluator is None:
+            return self.stone_difference_evaluator(agent_number, self.__evaluation_board)
+        return self.__evaluator(agent_number, self.__evaluation_board)
+
+    def __end_value(self, player, opponent):
+        difference = bit_board.count_bits(player) - bit_board.count_bits(opponent)
+        if difference > 0:
+            return self.WIN_VALUE + difference
+        if difference < 0:
+            return -self.WIN_VALUE + difference
+        return 0
+
+    # zobrist_hash includes the turn (agent_number)
+    def __negamax(self, agent_number, player, opponent, zobrist_hash, depth, alpha, beta):
+        self.__node_count += 1
+        if time.perf_counter() > self.__deadline:
+            raise SearchTimeoutException()
+        moves_bits = bit_board.get_moves(player, opponent)
+        if moves_bits == 0:
+            if not bit_board.has_moves(opponent, player):
+                return self.__end_value(player, opponent)
+            return -self.__negamax(-agent_number, opponent, player, zobrist_hash ^ transposition_table.ZOBRIST_TURN_KEY,
+                                   depth, -beta, -alpha)
+        if depth == 0:
+            return self.__evaluate(agent_number, player, opponent)
+        original_alpha = alpha
+        best_move = -1
+        table_entry = self.__transposition_table.probe(zobrist_hash)
+        if table_entry is not None:
+            table_value, table_depth, table_flag, best_move = table_entry
+            if table_depth >= depth:
+                if table_flag == transposition_table.TranspositionTable.EXACT:
+                    return table_value
+                if table_flag == transposition_table.TranspositionTable.LOWER_BOUND:
+                    alpha = max(alpha, table_value)
+                else:
+                    beta = min(beta, table_value)
+                if alpha >= beta:
+                    return table_value
+        max_value = -math.inf
+        for index in self.__order_moves(moves_bits, best_move):
+            flips = bit_board.get_flips(index, player, opponent)
+            next_hash = transposition_table.update_zobrist_hash(zobrist_hash, index, flips, agent_number)
+            value = -self.__negamax(
+                -agent_number,
+                opponent & ~flips,
+                player | flips | (1 << index),
+                next_hash ^ transposition_table.ZOBRIST_TURN_KEY,
+                depth - 1,
+                -beta,
+                -alpha
+            )
+            if max_value < value:
+                max_value = value
+                best_move = index
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+        if max_value <= original_alpha:
+            flag = transposition_table.TranspositionTable.UPPER_BOUND
+        elif max_value >= beta:
+            flag = transposition_table.TranspositionTable.LOWER_BOUND
+        else:
+            flag = transposition_table.TranspositionTable.EXACT
+        self.__transposition_table.store(zobrist_hash, max_value, depth, flag, best_move)
+        return max_value
+
+    def __search_root(self, player, opponent, zobrist_hash, depth, moves):
+        alpha = -math.inf
+        best_move = moves[0]
+        for index in moves:
+            flips = bit_board.get_flips(index, player, opponent)
+            next_hash = transposition_table.update_zobrist_hash(zobrist_hash, index, flips, self.agent_number)
+            value = -self.__negamax(
+                -self.agent_number,
+                opponent & ~flips,
+                player | flips | (1 << index),
+                next_hash ^ transposition_table.ZOBRIST_TURN_KEY,
+                depth - 1,
+                -math.inf,
+                -alpha
+            )
+            if alpha < value:
+                alpha = value
+                best_move = index
+        return best_move
+
+    def next_step(self):
+        self.__deadline = time.perf_counter() + self.__TIME_LIMIT
+        self.__node_count = 0
+        self.__searched_depth = 0
+        player, opponent = bit_board.from_reversi_board(self.agent_number, self.belong_game_board.reversi_board)
+        zobrist_hash = self.belong_game_board.zobrist_hash
+        if self.agent_number == 1:
+            zobrist_hash ^= transposition_table.ZOBRIST_TURN_KEY
+        moves = self.__order_moves(bit_board.get_moves(player, opponent), -1)
+        ret = moves[0]
+        empty_count = 64 - bit_board.count_bits(player | opponent)
+        for depth in range(1, min(self.__MAX_DEPTH, empty_count) + 1):
+            try:
+                ret = self.__search_root(player, opponent, zobrist_hash, depth, moves)
+            except SearchTimeoutException:
+                break
+            self.__searched_depth = depth
+            # search the best move of the previous depth first
+            moves.remove(ret)
+            moves.insert(0, ret)
+        return ret >> 3, ret & 7
+
+    @property
+    def searched_depth(self):
+        return self.__searched_depth
+
+    @property
+    def node_count(self):
+        return self.__node_count
+
+    def copy(self):
+        ret = AlphaBetaAgent(self.__evaluator, self.__TIME_LIMIT, self.__MAX_DEPTH, self.__transposition_table.size)
+        return ret
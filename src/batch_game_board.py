@@ -0,0 +1,105 @@
+import numpy as np
+import agent
+import bit_board
+
+
+# Play many games in lockstep. white = -1, black = 1 (same as GameBoard)
+class BatchGameBoard(object):
+    def __init__(self, first_agent, second_agent, number_games):
+        if (not isinstance(first_agent, agent.Agent)) or (not isinstance(second_agent, agent.Agent)):
+            raise Exception("Inherit the Agent class.")
+        if number_games <= 0:
+            raise Exception("Number of games must be positive.")
+        self.__first_agent = first_agent
+        self.__first_agent.agent_number = -1
+        self.__second_agent = second_agent
+        self.__second_agent.agent_number = 1
+        self.__NUMBER_GAMES = number_games
+        self.__black_bits = np.zeros(number_games, dtype=np.uint64)
+        self.__white_bits = np.zeros(number_games, dtype=np.uint64)
+        self.__turn_agent_numbers = np.zeros(number_games, dtype=np.int64)
+        # white win = -1, black win = 1, draw = 2, nothing = 0
+        self.__game_results = np.zeros(number_games, dtype=np.int64)
+
+    def __init_board(self):
+        self.__black_bits.fill(np.uint64(0x0000000810000000))
+        self.__white_bits.fill(np.uint64(0x0000001008000000))
+        self.__turn_agent_numbers = np.where(np.random.randint(0, 2, self.__NUMBER_GAMES) == 0, -1, 1)
+        self.__game_results.fill(0)
+
+    def get_bits(self, agent_number):
+        if abs(agent_number) != 1:
+            raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
+        if agent_number == 1:
+            return self.__black_bits, self.__white_bits
+        return self.__white_bits, self.__black_bits
+
+    def get_selectable_bits(self, agent_number):
+        player, opponent = self.get_bits(agent_number)
+        return bit_board.get_moves_array(player, opponent)
+
+    # return (number games, 8, 8) array
+    @property
+    def reversi_boards(self):
+        return (bit_board.to_cell_matrix(self.__black_bits).astype(np.float64)
+                - bit_board.to_cell_matrix(self.__white_bits)).reshape(-1, 8, 8)
+
+    def count_stones(self, agent_number):
+        return bit_board.count_bits_array(self.get_bits(agent_number)[0])
+
+    def __update_game_end(self, is_playing, black_moves, white_moves):
+        is_end = is_playing & (black_moves == 0) & (white_moves == 0)
+        if not np.any(is_end):
+            return
+        white_stones = self.count_stones(-1)
+        black_stones = self.count_stones(1)
+        self.__game_results[is_end & (white_stones == black_stones)] = 2
+        self.__game_results[is_end & (white_stones > black_stones)] = -1
+        self.__game_results[is_end & (white_stones < black_stones)] = 1
+
+    def __put_stones(self, agent_number, indexes):
+        player, opponent = self.get_bits(agent_number)
+        flips, put_bits = bit_board.get_flips_array(indexes, player, opponent)
+        player ^= flips | put_bits
+        opponent ^= flips
+
+    def __play_one_ply(self):
+        is_playing = self.__game_results == 0
+        black_moves = bit_board.get_moves_array(self.__black_bits, self.__white_bits)
+        white_moves = bit_board.get_moves_array(self.__white_bits, self.__black_bits)
+        self.__update_game_end(is_playing, black_moves, white_moves)
+        is_playing = self.__game_results == 0
+        turn_moves = np.where(self.__turn_agent_numbers == 1, black_moves, white_moves)
+        # pass
+        is_pass = is_playing & (turn_moves == 0)
+        self.__turn_agent_numbers[is_pass] *= -1
+        turn_moves[is_pass] = np.where(self.__turn_agent_numbers[is_pass] == 1, black_moves[is_pass],
+                                       white_moves[is_pass])
+        for now_agent in [self.__first_agent, self.__second_agent]:
+            is_select = is_playing & (self.__turn_agent_numbers == now_agent.agent_number)
+            if not np.any(is_select):
+                continue
+            indexes = np.full(self.__NUMBER_GAMES, -1, dtype=np.int64)
+            indexes[is_select] = np.asarray(now_agent.next_step_batch(self, turn_moves[is_select]))
+            self.__put_stones(now_agent.agent_number, indexes)
+        self.__turn_agent_numbers[is_playing] *= -1
+        return np.any(is_playing)
+
+    # return game result of each board (white win = -1, black win = 1, draw = 2)
+    def game_start(self):
+        self.__init_board()
+        while self.__play_one_ply():
+            pass
+        return np.copy(self.__game_results)
+
+    @property
+    def number_games(self):
+        return self.__NUMBER_GAMES
+
+    @property
+    def turn_agent_numbers(self):
+        return self.__turn_agent_numbers
+
+    @property
+    def game_results(self):
+        return self.__game_results
@@ -1,4 +1,8 @@
 import game_board
+import batch_game_board
+import headless_runner
+import numpy as np
+import random
 import tqdm
 import concurrent.futures
 
@@ -9,22 +13,47 @@ def output_match_result(times, count, first_agent, second_agent):
         first_agent.agent_name, count[0], second_agent.agent_name, count[2], count[1]))
 
 
-def battle_start_parallelization(times, first_agent, second_agent):
-    progress_bar = tqdm.tqdm(total=times)
-    executor = concurrent.futures.ProcessPoolExecutor()
-    waiting_queue = []
+# agents of each worker process (sent once by the initializer, the players of each game are the copies)
+_worker_agents = None
+
+
+def _init_battle_worker(first_agent, second_agent):
+    global _worker_agents
+    _worker_agents = (first_agent, second_agent)
+
+
+# return count (first win, draw, second win)
+def _battle_chunk(times, seed):
+    random.seed(seed)
+    np.random.seed(seed)
     count = [0, 0, 0]
     for index in range(0, times):
-        first_copy = first_agent.copy()
-        second_copy = second_agent.copy()
-        game = game_board.GameBoard(first_copy, second_copy)
-        waiting_queue.append(executor.submit(game.game_start))
-    for end_game in concurrent.futures.as_completed(waiting_queue):
-        game_result = end_game.result()[0] + 1
+        # copies of each game (the same agent for both players in self-play, learning in a game is not carried over)
+        runner = headless_runner.HeadlessRunner(_worker_agents[0].copy(), _worker_agents[1].copy())
+        game_result = runner.game_start().winner + 1
         if game_result == 3:
             game_result = 1
         count[game_result] += 1
-        progress_bar.update(1)
+    return count
+
+
+def battle_start_parallelization(times, first_agent, second_agent, max_workers=None, chunk_size=50):
+    progress_bar = tqdm.tqdm(total=times)
+    count = [0, 0, 0]
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_battle_worker,
+            initargs=(first_agent, second_agent)
+    ) as executor:
+        waiting_queue = []
+        for start_index in range(0, times, chunk_size):
+            chunk_times = min(chunk_size, times - start_index)
+            waiting_queue.append(executor.submit(_battle_chunk, chunk_times, random.getrandbits(32)))
+        for end_chunk in concurrent.futures.as_completed(waiting_queue):
+            chunk_count = end_chunk.result()
+            for index in range(0, 3):
+                count[index] += chunk_count[index]
+            progress_bar.update(sum(chunk_count))
     progress_bar.close()
     output_match_result(times, count, first_agent, second_agent)
 
@@ -32,12 +61,32 @@ def battle_start_parallelization(times, first_agent, second_agent):
 def battle_start(times, first_agent, second_agent):
     progress_bar = tqdm.tqdm(total=times)
     count = [0, 0, 0]
+    if first_agent.is_lunch_control_panel or second_agent.is_lunch_control_panel:
+        # new GameBoard for each game (game_start does not clear the result of the previous game)
+        def play_game():
+            return game_board.GameBoard(first_agent, second_agent).game_start()[0]
+    else:
+        runner = headless_runner.HeadlessRunner(first_agent, second_agent)
+
+        def play_game():
+            return runner.game_start().winner
     for index in range(0, times):
-        game = game_board.GameBoard(first_agent, second_agent)
-        game_result = game.game_start()[0] + 1
+        game_result = play_game() + 1
         if game_result == 3:
             game_result = 1
         count[game_result] += 1
         progress_bar.update(1)
     progress_bar.close()
     output_match_result(times, count, first_agent, second_agent)
+
+
+# both agents must support next_step_batch
+def battle_start_batch(times, first_agent, second_agent):
+    game = batch_game_board.BatchGameBoard(first_agent, second_agent, times)
+    game_results = game.game_start()
+    count = [
+        int(np.count_nonzero(game_results == -1)),
+        int(np.count_nonzero(game_results == 2)),
+        int(np.count_nonzero(game_results == 1))
+    ]
+    output_match_result(times, count, first_agent, second_agent)
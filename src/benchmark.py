@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import agent
+import battle
+import game_board
+import learn
+
+
+# modules of board and agents path (imported by every worker process of battle / learn)
+CORE_MODULES = ["game_board", "agent", "headless_runner", "battle", "learn"]
+IMPORT_SECONDS_BUDGET = 1.0
+IMPORT_MAX_RSS_MB_BUDGET = 150.0
+_IMPORT_CODE = """import resource, sys, time
+start_time = time.perf_counter()
+import %s
+max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# ru_maxrss is bytes on macOS, kilobytes on Linux
+print(time.perf_counter() - start_time, max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024))
+print(" ".join(name for name in ["tensorflow", "torch"] if name in sys.modules))
+"""
+
+
+# position = (moves (cell index, -1 is pass), turn agent number), same seed is same positions
+def generate_positions(number_positions, seed):
+    random_generator = random.Random(seed)
+    ret = []
+    while len(ret) < number_positions:
+        search_board = game_board.SearchBoard(game_board.SearchBoard.get_initial_reversi_board())
+        turn_agent_number = 1
+        moves = []
+        while len(ret) < number_positions:
+            selectable_cells = search_board.get_selectable_cells(turn_agent_number)
+            if len(selectable_cells) == 0:
+                if not search_board.has_legal_move(turn_agent_number * -1):
+                    break
+                moves.append(-1)
+                turn_agent_number *= -1
+                continue
+            ret.append((list(moves), turn_agent_number))
+            cell = selectable_cells[random_generator.randint(0, len(selectable_cells) - 1)]
+            search_board.make_move(cell[0], cell[1], turn_agent_number)
+            moves.append(int(cell[0]) * 8 + int(cell[1]))
+            turn_agent_number *= -1
+    return ret
+
+
+def _replay_position(game, moves):
+    game.reset_game()
+    turn_agent_number = 1
+    for move in moves:
+        if move != -1:
+            game.put_stone(move >> 3, move & 7, turn_agent_number)
+        turn_agent_number *= -1
+    return turn_agent_number
+
+
+def _generate_reversi_boards(positions):
+    ret = []
+    for moves, turn_agent_number in positions:
+        search_board = game_board.SearchBoard(game_board.SearchBoard.get_initial_reversi_board())
+        now_agent_number = 1
+        for move in moves:
+            if move != -1:
+                search_board.make_move(move >> 3, move & 7, now_agent_number)
+            now_agent_number *= -1
+        ret.append((np.copy(search_board.reversi_board), turn_agent_number))
+    return ret
+
+
+# import in a new process (same as worker process start up)
+def benchmark_import():
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_CODE % ", ".join(CORE_MODULES)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True
+    ).stdout.split("\n")
+    seconds, max_rss_mb = [float(value) for value in output[0].split()]
+    return {
+        "import_core_seconds": (seconds, "s", False),
+        "import_core_max_rss_mb": (max_rss_mb, "MB", False),
+    }, output[1].split()
+
+
+# return budget violation messages
+def check_import_budget(results, heavy_modules, seconds_budget, max_rss_mb_budget):
+    ret = ["%s is loaded by import of core modules" % name for name in heavy_modules]
+    seconds = results["metrics"]["import_core_seconds"]["value"]
+    max_rss_mb = results["metrics"]["import_core_max_rss_mb"]["value"]
+    if seconds > seconds_budget:
+        ret.append("import_core_seconds: %.4f > %.4f s" % (seconds, seconds_budget))
+    if max_rss_mb > max_rss_mb_budget:
+        ret.append("import_core_max_rss_mb: %.1f > %.1f MB" % (max_rss_mb, max_rss_mb_budget))
+    return ret
+
+
+def benchmark_move_generation(positions):
+    reversi_boards = _generate_reversi_boards(positions)
+    start_time = time.perf_counter()
+    for reversi_board, turn_agent_number in reversi_boards:
+        game_board.GameBoard.get_selectable_cells_custom_board(turn_agent_number, reversi_board)
+    selectable_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for reversi_board, turn_agent_number in reversi_boards:
+        for cell in game_board.GameBoard.get_selectable_cells_custom_board(turn_agent_number, reversi_board):
+            game_board.GameBoard.get_reverse_cells_custom_board(cell[0], cell[1], turn_agent_number, reversi_board)
+    reverse_time = time.perf_counter() - start_time
+    return {
+        "move_generation_positions_per_second": (len(reversi_boards) / selectable_time, "positions/s", True),
+        "flip_positions_per_second": (len(reversi_boards) / reverse_time, "positions/s", True),
+    }
+
+
+def _generate_benchmark_agents():
+    ga_board_agent = agent.GABoardAgent()
+    ga_board_agent.set_random_evaluation_board()
+    ret = {
+        "Random": agent.RandomAgent(),
+        "GABoard": ga_board_agent,
+        "QLearning": agent.QLeaningAgent(False),
+        "NNGA": agent.NeuralNetworkGALeaningAgent(True),
+    }
+    try:
+        ret["DQN"] = agent.DQNAgent(False, 32, 0.0, 0.9)
+    except Exception as exception:
+        print("skip DQN benchmark: " + str(exception), file=sys.stderr)
+    return ret
+
+
+def benchmark_agent_latency(positions):
+    ret = {}
+    for agent_name, now_agent in _generate_benchmark_agents().items():
+        latency = []
+        for moves, turn_agent_number in positions:
+            if turn_agent_number == -1:
+                game = game_board.GameBoard(now_agent, agent.RandomAgent())
+            else:
+                game = game_board.GameBoard(agent.RandomAgent(), now_agent)
+            game.turn_agent_number = _replay_position(game, moves)
+            start_time = time.perf_counter()
+            now_agent.next_step()
+            latency.append(time.perf_counter() - start_time)
+        for percentile in [50, 90, 99]:
+            ret["next_step_" + agent_name + "_p" + str(percentile) + "_ms"] = (
+                float(np.percentile(latency, percentile)) * 1000,
+                "ms",
+                False
+            )
+    return ret
+
+
+def benchmark_battle(times, worker_counts):
+    ret = {}
+    first_agent = agent.GABoardAgent()
+    first_agent.set_random_evaluation_board()
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+        battle.battle_start(times, first_agent, agent.RandomAgent())
+        ret["battle_start_games_per_second"] = (times / (time.perf_counter() - start_time), "games/s", True)
+        for worker_count in worker_counts:
+            start_time = time.perf_counter()
+            battle.battle_start_parallelization(times, first_agent, agent.RandomAgent(), worker_count)
+            ret["battle_start_parallelization_" + str(worker_count) + "_games_per_second"] = (
+                times / (time.perf_counter() - start_time),
+                "games/s",
+                True
+            )
+        # self-play (the same agent object for both players)
+        for worker_count in worker_counts:
+            start_time = time.perf_counter()
+            battle.battle_start_parallelization(times, first_agent, first_agent, worker_count)
+            ret["battle_start_parallelization_self_play_" + str(worker_count) + "_games_per_second"] = (
+                times / (time.perf_counter() - start_time),
+                "games/s",
+                True
+            )
+    return ret
+
+
+def benchmark_learning(generations):
+    ret = {}
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+        learn.GALearning(generations).start(directory + "/ga", generations + 1)
+        ret["ga_learning_generations_per_hour"] = (
+            generations * 3600 / (time.perf_counter() - start_time),
+            "generations/h",
+            True
+        )
+        start_time = time.perf_counter()
+        learn.NNGALearning(generations, True, 10, 3).start(directory + "/nnga", generations + 1)
+        ret["nnga_learning_generations_per_hour"] = (
+            generations * 3600 / (time.perf_counter() - start_time),
+            "generations/h",
+            True
+        )
+    return ret
+
+
+# return regression messages (metric is worse than baseline over tolerance)
+def compare_baseline(results, baseline, tolerance):
+    ret = []
+    for name, baseline_metric in baseline["metrics"].items():
+        if name not in results["metrics"]:
+            continue
+        now_value = results["metrics"][name]["value"]
+        baseline_value = baseline_metric["value"]
+        if baseline_metric["higher_is_better"]:
+            is_regression = now_value < baseline_value * (1 - tolerance)
+        else:
+            is_regression = now_value > baseline_value * (1 + tolerance)
+        if is_regression:
+            ret.append("%s: %.4f -> %.4f %s" % (name, baseline_value, now_value, baseline_metric["unit"]))
+    return ret
+
+
+def run(number_positions, battle_times, worker_counts, generations, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    positions = generate_positions(number_positions, seed)
+    metrics, heavy_modules = benchmark_import()
+    metrics.update(benchmark_move_generation(positions))
+    metrics.update(benchmark_agent_latency(positions[:max(1, number_positions // 10)]))
+    metrics.update(benchmark_battle(battle_times, worker_counts))
+    if generations > 0:
+        metrics.update(benchmark_learning(generations))
+    return {
+        "seed": seed,
+        "heavy_modules": heavy_modules,
+        "metrics": {
+            name: {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+            for name, (value, unit, higher_is_better) in metrics.items()
+        }
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of ReversiAI hot paths.")
+    parser.add_argument("--output", default="benchmark_result.json", help="result json file path")
+    parser.add_argument("--baseline", default=None, help="baseline json file path to compare")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown ratio")
+    parser.add_argument("--positions", type=int, default=2000)
+    parser.add_argument("--battle-times", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--generations", type=int, default=1, help="0 is skip learning benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--import-seconds-budget", type=float, default=IMPORT_SECONDS_BUDGET)
+    parser.add_argument("--import-rss-budget", type=float, default=IMPORT_MAX_RSS_MB_BUDGET, help="MB")
+    args = parser.parse_args(argv)
+    results = run(args.positions, args.battle_times, args.workers, args.generations, args.seed)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    for name, metric in results["metrics"].items():
+        print("%s: %.4f %s" % (name, metric["value"], metric["unit"]))
+    violations = check_import_budget(
+        results,
+        results["heavy_modules"],
+        args.import_seconds_budget,
+        args.import_rss_budget
+    )
+    for message in violations:
+        print("over budget " + message)
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare_baseline(results, json.load(file), args.tolerance)
+    for message in regressions:
+        print("regression " + message)
+    return 1 if len(regressions) + len(violations) != 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import numpy as np
+
+# bit index = vertical index * 8 + horizontal index (bit 0 is cell (0, 0))
+FULL_MASK = 0xFFFFFFFFFFFFFFFF
+NOT_LEFT_MASK = 0xFEFEFEFEFEFEFEFE  # without horizontal index 0
+NOT_RIGHT_MASK = 0x7F7F7F7F7F7F7F7F  # without horizontal index 7
+
+# (shift, mask of the destination cells), shift plus is left shift
+DIRECTIONS = (
+    (1, NOT_LEFT_MASK),
+    (-1, NOT_RIGHT_MASK),
+    (8, FULL_MASK),
+    (-8, FULL_MASK),
+    (9, NOT_LEFT_MASK),
+    (7, NOT_RIGHT_MASK),
+    (-7, NOT_LEFT_MASK),
+    (-9, NOT_RIGHT_MASK),
+)
+
+
+def shift_bits(bits, shift):
+    if shift > 0:
+        return (bits << shift) & FULL_MASK
+    return bits >> -shift
+
+
+def from_reversi_board(agent_number, custom_reversi_board):
+    flatten = np.asarray(custom_reversi_board).reshape(64)
+    player = int.from_bytes(np.packbits(flatten == agent_number, bitorder="little").tobytes(), "little")
+    opponent = int.from_bytes(np.packbits(flatten == -agent_number, bitorder="little").tobytes(), "little")
+    return player, opponent
+
+
+def to_reversi_board(agent_number, player, opponent, custom_reversi_board=None):
+    if custom_reversi_board is None:
+        custom_reversi_board = np.zeros(8 * 8).reshape(8, 8)
+    custom_reversi_board.fill(0)
+    flatten = custom_reversi_board.reshape(64)
+    flatten[to_indexes(player)] = agent_number
+    flatten[to_indexes(opponent)] = -agent_number
+    return custom_reversi_board
+
+
+def to_indexes(bits):
+    ret = []
+    while bits:
+        lowest_bit = bits & -bits
+        ret.append(lowest_bit.bit_length() - 1)
+        bits ^= lowest_bit
+    return ret
+
+
+def to_cells(bits):
+    return [(index >> 3, index & 7) for index in to_indexes(bits)]
+
+
+def from_cells(cells):
+    ret = 0
+    for vertical_index, horizontal_index in cells:
+        ret |= 1 << (vertical_index * 8 + horizontal_index)
+    return ret
+
+
+def count_bits(bits):
+    return bin(bits).count("1")
+
+
+def get_moves(player, opponent):
+    empty = ~(player | opponent) & FULL_MASK
+    ret = 0
+    for shift, mask in DIRECTIONS:
+        inner_opponent = opponent & mask
+        if shift > 0:
+            candidate = inner_opponent & (player << shift)
+            for times in range(0, 5):
+                candidate |= inner_opponent & (candidate << shift)
+            ret |= (candidate << shift) & mask & empty
+        else:
+            candidate = inner_opponent & (player >> -shift)
+            for times in range(0, 5):
+                candidate |= inner_opponent & (candidate >> -shift)
+            ret |= (candidate >> -shift) & mask & empty
+    return ret
+
+
+def get_flips(index, player, opponent):
+    ret = 0
+    put_bit = 1 << int(index)
+    if (player | opponent) & put_bit:
+        return 0
+    for shift, mask in DIRECTIONS:
+        save = 0
+        cursor = shift_bits(put_bit, shift) & mask
+        while cursor & opponent:
+            save |= cursor
+            cursor = shift_bits(cursor, shift) & mask
+        if cursor & player:
+            ret |= save
+    return ret
+
+
+# early exit version of get_moves
+def has_moves(player, opponent):
+    empty = ~(player | opponent) & FULL_MASK
+    for shift, mask in DIRECTIONS:
+        inner_opponent = opponent & mask
+        candidate = inner_opponent & shift_bits(player, shift)
+        for times in range(0, 5):
+            candidate |= inner_opponent & shift_bits(candidate, shift)
+        if shift_bits(candidate, shift) & mask & empty:
+            return True
+    return False
+
+
+# under about bitboard arrays (numpy uint64, one board per element)
+def _shift_array(bits_array, shift):
+    if shift > 0:
+        return np.left_shift(bits_array, np.uint64(shift))
+    return np.right_shift(bits_array, np.uint64(-shift))
+
+
+def from_reversi_board_array(agent_number, reversi_board_array):
+    flatten = np.asarray(reversi_board_array).reshape(-1, 64)
+    player = np.packbits(flatten == agent_number, axis=1, bitorder="little").view("<u8").reshape(-1)
+    opponent = np.packbits(flatten == -agent_number, axis=1, bitorder="little").view("<u8").reshape(-1)
+    return player.astype(np.uint64), opponent.astype(np.uint64)
+
+
+def to_cell_matrix(bits_array):
+    bytes_array = np.asarray(bits_array, dtype=np.uint64).astype("<u8").view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(bytes_array, axis=1, bitorder="little").astype(bool)
+
+
+def count_bits_array(bits_array):
+    # popcount instruction (numpy 2.0 or later)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(np.asarray(bits_array, dtype=np.uint64)).astype(np.int64)
+    return to_cell_matrix(bits_array).sum(axis=1)
+
+
+def get_moves_array(player, opponent):
+    empty = ~(player | opponent)
+    ret = np.zeros_like(player)
+    for shift, mask in DIRECTIONS:
+        mask = np.uint64(mask)
+        inner_opponent = opponent & mask
+        candidate = inner_opponent & _shift_array(player, shift)
+        for times in range(0, 5):
+            candidate |= inner_opponent & _shift_array(candidate, shift)
+        ret |= _shift_array(candidate, shift) & mask & empty
+    return ret
+
+
+# index -1 is no move (return 0)
+def get_flips_array(indexes, player, opponent):
+    indexes = np.asarray(indexes)
+    put_bits = np.where(
+        indexes >= 0,
+        np.left_shift(np.uint64(1), np.maximum(indexes, 0).astype(np.uint64)),
+        np.uint64(0)
+    ).astype(np.uint64)
+    put_bits &= ~(player | opponent)
+    ret = np.zeros_like(player)
+    for shift, mask in DIRECTIONS:
+        mask = np.uint64(mask)
+        line = _shift_array(put_bits, shift) & mask & opponent
+        for times in range(0, 5):
+            line |= _shift_array(line, shift) & mask & opponent
+        is_sandwich = (_shift_array(line, shift) & mask & player) != 0
+        ret |= np.where(is_sandwich, line, np.uint64(0))
+    return ret, put_bits
@@ -0,0 +1,111 @@
+import numpy as np
+import bit_board
+
+# region masks (bitboard)
+ALL_BITS = bit_board.FULL_MASK
+CORNER_BITS = bit_board.from_cells([(0, 0), (0, 7), (7, 0), (7, 7)])
+X_SQUARE_BITS = bit_board.from_cells([(1, 1), (1, 6), (6, 1), (6, 6)])
+C_SQUARE_BITS = bit_board.from_cells([(0, 1), (1, 0), (0, 6), (1, 7), (6, 0), (7, 1), (6, 7), (7, 6)])
+EDGE_BITS = bit_board.from_cells(
+    [(0, index) for index in range(0, 8)] + [(7, index) for index in range(0, 8)]
+    + [(index, 0) for index in range(1, 7)] + [(index, 7) for index in range(1, 7)]
+)
+CENTER_BITS = bit_board.from_cells([(vertical, horizontal) for vertical in [3, 4] for horizontal in [3, 4]])
+CENTER_SIXTEEN_BITS = bit_board.from_cells(
+    [(vertical, horizontal) for vertical in range(2, 6) for horizontal in range(2, 6)]
+)
+
+# kind of feature (the value is counted in the region)
+MY_COUNT = "my_count"
+ENEMY_COUNT = "enemy_count"
+DIFFERENCE = "difference"  # my count - enemy count
+MY_MOBILITY = "my_mobility"
+ENEMY_MOBILITY = "enemy_mobility"
+FEATURE_KINDS = [MY_COUNT, ENEMY_COUNT, DIFFERENCE, MY_MOBILITY, ENEMY_MOBILITY]
+
+# input of NeuralNetworkGALeaningAgent
+NNGA_FEATURES = [
+    (MY_COUNT, CORNER_BITS),
+    (ENEMY_COUNT, CORNER_BITS),
+    (MY_COUNT, ALL_BITS),
+    (ENEMY_COUNT, ALL_BITS),
+    (DIFFERENCE, CENTER_BITS),
+    (DIFFERENCE, CENTER_SIXTEEN_BITS),
+    (ENEMY_MOBILITY, ALL_BITS),
+    (DIFFERENCE, X_SQUARE_BITS),
+]
+
+
+# features = list of (kind, region bits). add a region feature without new loop
+class FeatureExtractor(object):
+    def __init__(self, features=None):
+        self.__features = []
+        for kind, region_bits in NNGA_FEATURES if features is None else features:
+            self.add_feature(kind, region_bits)
+
+    def add_feature(self, kind, region_bits):
+        if kind not in FEATURE_KINDS:
+            raise Exception("Select feature kind from " + str(FEATURE_KINDS))
+        self.__features.append((kind, int(region_bits) & bit_board.FULL_MASK))
+
+    # region is list of (vertical index, horizontal index)
+    def add_region_feature(self, kind, cells):
+        self.add_feature(kind, bit_board.from_cells(cells))
+
+    @property
+    def features(self):
+        return list(self.__features)
+
+    @property
+    def size(self):
+        return len(self.__features)
+
+    def __is_use_kind(self, kinds):
+        return any(kind in kinds for kind, region_bits in self.__features)
+
+    # player and opponent are int
+    def extract_bits(self, player, opponent):
+        ret = np.zeros(len(self.__features))
+        my_moves = bit_board.get_moves(player, opponent) if self.__is_use_kind([MY_MOBILITY]) else 0
+        enemy_moves = bit_board.get_moves(opponent, player) if self.__is_use_kind([ENEMY_MOBILITY]) else 0
+        for index, (kind, region_bits) in enumerate(self.__features):
+            if kind == MY_COUNT:
+                ret[index] = bit_board.count_bits(player & region_bits)
+            elif kind == ENEMY_COUNT:
+                ret[index] = bit_board.count_bits(opponent & region_bits)
+            elif kind == DIFFERENCE:
+                ret[index] = bit_board.count_bits(player & region_bits) - bit_board.count_bits(opponent & region_bits)
+            elif kind == MY_MOBILITY:
+                ret[index] = bit_board.count_bits(my_moves & region_bits)
+            else:
+                ret[index] = bit_board.count_bits(enemy_moves & region_bits)
+        return ret
+
+    # player and opponent are numpy uint64 arrays. return matrix (one row per board)
+    def extract_bits_array(self, player, opponent):
+        player = np.asarray(player, dtype=np.uint64).reshape(-1)
+        opponent = np.asarray(opponent, dtype=np.uint64).reshape(-1)
+        ret = np.zeros((len(player), len(self.__features)))
+        my_moves = bit_board.get_moves_array(player, opponent) if self.__is_use_kind([MY_MOBILITY]) else None
+        enemy_moves = bit_board.get_moves_array(opponent, player) if self.__is_use_kind([ENEMY_MOBILITY]) else None
+        for index, (kind, region_bits) in enumerate(self.__features):
+            region_bits = np.uint64(region_bits)
+            if kind == MY_COUNT:
+                ret[:, index] = bit_board.count_bits_array(player & region_bits)
+            elif kind == ENEMY_COUNT:
+                ret[:, index] = bit_board.count_bits_array(opponent & region_bits)
+            elif kind == DIFFERENCE:
+                ret[:, index] = (bit_board.count_bits_array(player & region_bits)
+                                 - bit_board.count_bits_array(opponent & region_bits))
+            elif kind == MY_MOBILITY:
+                ret[:, index] = bit_board.count_bits_array(my_moves & region_bits)
+            else:
+                ret[:, index] = bit_board.count_bits_array(enemy_moves & region_bits)
+        return ret
+
+    def extract(self, agent_number, custom_reversi_board):
+        return self.extract_bits(*bit_board.from_reversi_board(agent_number, custom_reversi_board))
+
+    # custom_reversi_boards shape is (N, 8, 8)
+    def extract_batch(self, agent_number, custom_reversi_boards):
+        return self.extract_bits_array(*bit_board.from_reversi_board_array(agent_number, custom_reversi_boards))
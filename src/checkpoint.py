@@ -0,0 +1,81 @@
+import os
+import queue
+import threading
+
+
+# Write weight snapshots from a background thread
+# writer(file_path, snapshot) writes the snapshot and returns the list of written file paths
+# max_to_keep is None: keep all checkpoints, keep_interval: keep every keep_interval-th checkpoint forever
+class CheckpointManager(object):
+    def __init__(self, writer, max_to_keep=None, keep_interval=None):
+        if max_to_keep is not None and max_to_keep <= 0:
+            raise Exception("max_to_keep of CheckpointManager must be positive.")
+        self.__writer = writer
+        self.__MAX_TO_KEEP = max_to_keep
+        self.__KEEP_INTERVAL = keep_interval
+        self.__queue = queue.Queue()
+        self.__save_count = 0
+        # list of file path list of each checkpoint (removable)
+        self.__kept_checkpoints = []
+        self.__saved_file_paths = []
+        self.__error = None
+        self.__lock = threading.Lock()
+        self.__thread = threading.Thread(target=self.__write_loop, daemon=True)
+        self.__thread.start()
+
+    def __write_loop(self):
+        while True:
+            task = self.__queue.get()
+            try:
+                if task is None:
+                    return
+                self.__write(*task)
+            except Exception as exception:
+                with self.__lock:
+                    self.__error = exception
+            finally:
+                self.__queue.task_done()
+
+    def __write(self, file_path, snapshot, is_permanent):
+        file_paths = self.__writer(file_path, snapshot)
+        with self.__lock:
+            self.__saved_file_paths.extend(file_paths)
+            if not is_permanent:
+                self.__kept_checkpoints.append(file_paths)
+            while self.__MAX_TO_KEEP is not None and len(self.__kept_checkpoints) > self.__MAX_TO_KEEP:
+                for remove_file_path in self.__kept_checkpoints.pop(0):
+                    if os.path.exists(remove_file_path):
+                        os.remove(remove_file_path)
+                    self.__saved_file_paths.remove(remove_file_path)
+
+    def __raise_error(self):
+        with self.__lock:
+            error = self.__error
+            self.__error = None
+        if error is not None:
+            raise error
+
+    # snapshot must not be changed after this call (copy of weights)
+    def save(self, file_path, snapshot):
+        self.__raise_error()
+        if not self.__thread.is_alive():
+            raise Exception("CheckpointManager is already closed.")
+        self.__save_count += 1
+        is_permanent = self.__KEEP_INTERVAL is not None and self.__save_count % self.__KEEP_INTERVAL == 0
+        self.__queue.put((file_path, snapshot, is_permanent))
+
+    # block until all snapshots are written
+    def wait(self):
+        self.__queue.join()
+        self.__raise_error()
+
+    def close(self):
+        if self.__thread.is_alive():
+            self.__queue.put(None)
+            self.__thread.join()
+        self.__raise_error()
+
+    @property
+    def saved_file_paths(self):
+        with self.__lock:
+            return list(self.__saved_file_paths)
@@ -0,0 +1,165 @@
+import time
+import agent
+import bit_board
+
+EXACT = "exact"  # final stone difference
+WIN_LOSS_DRAW = "wld"  # 1: win, 0: draw, -1: loss
+MODES = [EXACT, WIN_LOSS_DRAW]
+# quadrants of the board (parity of empty cells)
+QUADRANT_BITS = [
+    bit_board.from_cells([(vertical, horizontal) for vertical in range(0, 4) for horizontal in range(0, 4)]),
+    bit_board.from_cells([(vertical, horizontal) for vertical in range(0, 4) for horizontal in range(4, 8)]),
+    bit_board.from_cells([(vertical, horizontal) for vertical in range(4, 8) for horizontal in range(0, 4)]),
+    bit_board.from_cells([(vertical, horizontal) for vertical in range(4, 8) for horizontal in range(4, 8)]),
+]
+_QUADRANT_OF_INDEX = [(index >> 5) * 2 + ((index & 7) >> 2) for index in range(0, 64)]
+
+
+# Perfect play of the last empty cells (negamax alpha-beta on bitboards)
+# fastest-first (fewest opponent moves) ordering in upper depth, parity ordering near the end
+class EndgameSolver(object):
+    def __init__(self, fastest_first_empties=7, table_empties=9, table_size=2 ** 20):
+        self.__FASTEST_FIRST_EMPTIES = fastest_first_empties
+        # positions of table_empties or more empty cells are stored in transposition table
+        self.__TABLE_EMPTIES = table_empties
+        self.__TABLE_SIZE = table_size
+        # (player, opponent) -> (lower bound, upper bound, best move index)
+        self.__transposition_table = {}
+        self.__node_count = 0
+        self.__total_node_count = 0
+        self.__total_seconds = 0.0
+
+    # return list of (index, flips) in search order
+    def __order_moves(self, player, opponent, moves_bits, empties, best_move):
+        ret = []
+        empty = ~(player | opponent) & bit_board.FULL_MASK
+        if empties >= self.__FASTEST_FIRST_EMPTIES:
+            for index in bit_board.to_indexes(moves_bits):
+                flips = bit_board.get_flips(index, player, opponent)
+                next_player = player | flips | (1 << index)
+                enemy_moves = bit_board.get_moves(opponent & ~flips, next_player)
+                # best move of transposition table is the first
+                ret.append((-1 if index == best_move else bit_board.count_bits(enemy_moves), index, flips))
+        else:
+            odd_quadrants = [bit_board.count_bits(empty & quadrant) & 1 for quadrant in QUADRANT_BITS]
+            for index in bit_board.to_indexes(moves_bits):
+                ret.append((
+                    1 - odd_quadrants[_QUADRANT_OF_INDEX[index]],
+                    index,
+                    bit_board.get_flips(index, player, opponent)
+                ))
+        ret.sort(key=lambda move: move[0])
+        return [(index, flips) for key, index, flips in ret]
+
+    # return (value, best move index), best move index is -1 for pass or end
+    def __search(self, player, opponent, alpha, beta, empties):
+        self.__node_count += 1
+        moves_bits = bit_board.get_moves(player, opponent)
+        if moves_bits == 0:
+            if not bit_board.has_moves(opponent, player):
+                return bit_board.count_bits(player) - bit_board.count_bits(opponent), -1
+            return -self.__search(opponent, player, -beta, -alpha, empties)[0], -1
+        table_best_move = -1
+        is_use_table = empties >= self.__TABLE_EMPTIES
+        if is_use_table:
+            entry = self.__transposition_table.get((player, opponent))
+            if entry is not None:
+                lower, upper, table_best_move = entry
+                if lower >= beta or lower == upper:
+                    return lower, table_best_move
+                if upper <= alpha:
+                    return upper, table_best_move
+                alpha = max(alpha, lower)
+                beta = min(beta, upper)
+        first_alpha = alpha
+        best_value = -65
+        best_move = -1
+        for index, flips in self.__order_moves(player, opponent, moves_bits, empties, table_best_move):
+            value = -self.__search(opponent & ~flips, player | flips | (1 << index), -beta, -alpha, empties - 1)[0]
+            if value > best_value:
+                best_value = value
+                best_move = index
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        if is_use_table:
+            if len(self.__transposition_table) >= self.__TABLE_SIZE:
+                self.__transposition_table.clear()
+            lower, upper = -64, 64
+            if best_value > first_alpha:
+                lower = best_value
+            if best_value < beta:
+                upper = best_value
+            self.__transposition_table[(player, opponent)] = (lower, upper, best_move)
+        return best_value, best_move
+
+    # player / opponent are bits of turn agent. return (value, best move index)
+    def solve_bits(self, player, opponent, mode=EXACT):
+        if mode not in MODES:
+            raise Exception("Select mode from " + str(MODES))
+        self.__node_count = 0
+        # bounds depend on the window, clear for each solve
+        self.__transposition_table.clear()
+        empties = 64 - bit_board.count_bits(player | opponent)
+        start_time = time.perf_counter()
+        if mode == EXACT:
+            value, best_move = self.__search(player, opponent, -65, 65, empties)
+        else:
+            # null window around draw
+            value, best_move = self.__search(player, opponent, -1, 1, empties)
+            value = (value > 0) - (value < 0)
+        self.__total_seconds += time.perf_counter() - start_time
+        self.__total_node_count += self.__node_count
+        return value, best_move
+
+    # return (value, best cell), best cell is None if the agent has no move
+    def solve(self, agent_number, custom_reversi_board, mode=EXACT):
+        player, opponent = bit_board.from_reversi_board(agent_number, custom_reversi_board)
+        value, best_move = self.solve_bits(player, opponent, mode)
+        if best_move == -1:
+            return value, None
+        return value, (best_move >> 3, best_move & 7)
+
+    # nodes of the last solve
+    @property
+    def node_count(self):
+        return self.__node_count
+
+    def get_statistics(self):
+        return {
+            "nodes": self.__total_node_count,
+            "seconds": self.__total_seconds,
+            "nodes_per_second": self.__total_node_count / self.__total_seconds if self.__total_seconds > 0 else 0.0,
+        }
+
+    def reset_statistics(self):
+        self.__total_node_count = 0
+        self.__total_seconds = 0.0
+
+
+# Agent wrapper, solve the endgame when empty cells are empties_threshold or less
+class EndgameAgent(agent.WrapperAgent):
+    def __init__(self, wrapped_agent, empties_threshold=12, mode=WIN_LOSS_DRAW):
+        if mode not in MODES:
+            raise Exception("Select mode from " + str(MODES))
+        super().__init__("Endgame", wrapped_agent)
+        self.__EMPTIES_THRESHOLD = empties_threshold
+        self.__MODE = mode
+        self.__solver = EndgameSolver()
+
+    def next_step(self):
+        board = self.belong_game_board
+        if 64 - board.count_stones(-1) - board.count_stones(1) <= self.__EMPTIES_THRESHOLD:
+            player, opponent = board.get_bits(self.agent_number)
+            best_move = self.__solver.solve_bits(player, opponent, self.__MODE)[1]
+            if best_move != -1:
+                return best_move >> 3, best_move & 7
+        return self.wrapped_agent.next_step()
+
+    @property
+    def solver(self):
+        return self.__solver
+
+    def copy(self):
+        return EndgameAgent(self.wrapped_agent.copy(), self.__EMPTIES_THRESHOLD, self.__MODE)
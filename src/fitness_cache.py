@@ -0,0 +1,80 @@
+import collections
+import hashlib
+import os
+import numpy as np
+
+
+# Battle results of each genome (key is hash of weight arrays), LRU bounded
+class FitnessCache(object):
+    def __init__(self, max_size=10000, file_path=None):
+        if max_size <= 0:
+            raise Exception("Size of FitnessCache must be positive.")
+        self.__MAX_SIZE = max_size
+        self.__file_path = file_path
+        # key -> [win, draw, games]
+        self.__records = collections.OrderedDict()
+        self.__hit_count = 0
+        self.__miss_count = 0
+        if file_path is not None and os.path.exists(file_path):
+            self.load(file_path)
+
+    # context is anything that changes the result (partner, turn, etc.)
+    @staticmethod
+    def calc_key(weight_arrays, context=""):
+        hash_function = hashlib.sha1()
+        for weight in weight_arrays:
+            weight = np.ascontiguousarray(weight)
+            hash_function.update(str(weight.dtype).encode())
+            hash_function.update(str(weight.shape).encode())
+            hash_function.update(weight.tobytes())
+        hash_function.update(str(context).encode())
+        return hash_function.hexdigest()
+
+    # return (win, draw, games) or None
+    def get(self, key):
+        if key not in self.__records:
+            self.__miss_count += 1
+            return None
+        self.__hit_count += 1
+        self.__records.move_to_end(key)
+        return tuple(self.__records[key])
+
+    def add(self, key, win, draw, games):
+        if key in self.__records:
+            record = self.__records[key]
+            record[0] += win
+            record[1] += draw
+            record[2] += games
+            self.__records.move_to_end(key)
+        else:
+            self.__records[key] = [win, draw, games]
+            if len(self.__records) > self.__MAX_SIZE:
+                self.__records.popitem(last=False)
+
+    def save(self, file_path=None):
+        if file_path is None:
+            file_path = self.__file_path
+        if file_path is None:
+            raise Exception("Select file path of FitnessCache.")
+        keys = np.array(list(self.__records.keys()), dtype=str)
+        records = np.array(list(self.__records.values()), dtype=np.int64).reshape(-1, 3)
+        with open(file_path, "wb") as file:
+            np.savez(file, keys=keys, records=records)
+
+    def load(self, file_path):
+        data = np.load(file_path)
+        for key, record in zip(data["keys"], data["records"]):
+            self.add(str(key), int(record[0]), int(record[1]), int(record[2]))
+
+    @property
+    def file_path(self):
+        return self.__file_path
+
+    def __len__(self):
+        return len(self.__records)
+
+    @property
+    def hit_rate(self):
+        if self.__hit_count + self.__miss_count == 0:
+            return 0.0
+        return self.__hit_count / (self.__hit_count + self.__miss_count)
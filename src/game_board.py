@@ -1,6 +1,8 @@
 import numpy as np
 import random
 import agent
+import bit_board
+import transposition_table
 
 
 # white = -1, nothing = 0. black = 1
@@ -14,15 +16,19 @@ class GameBoard(object):
         self.__second_agent = second_agent
         self.__second_agent.belong_game_board = self
         self.__second_agent.agent_number = 1
-        self.__reversi_board = np.zeros(8 * 8).reshape(8, 8)
+        self.__search_board = SearchBoard()
+        self.__reversi_board = self.__search_board.reversi_board
         self.__is_game_end = 0
         self.__turn_agent_number = 0
+        self.__selectable_cells_cache = {-1: None, 1: None}
 
     def __init_board(self):
-        self.__reversi_board[3][3] = 1
-        self.__reversi_board[3][4] = -1
-        self.__reversi_board[4][3] = -1
-        self.__reversi_board[4][4] = 1
+        self.__search_board.reset(SearchBoard.get_initial_reversi_board())
+        self.__clear_selectable_cells_cache()
+
+    def __clear_selectable_cells_cache(self):
+        self.__selectable_cells_cache[-1] = None
+        self.__selectable_cells_cache[1] = None
 
     @staticmethod
     def get_reverse_cells_custom_board(vertical_index, horizontal_index, agent_number, custom_reversi_board):
@@ -31,40 +37,9 @@ class GameBoard(object):
             raise IndexError("Reference outside of the board.")
         if abs(agent_number) != 1:
             raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
-
-        ret = []
-        save = []
-        if custom_reversi_board[vertical_index][horizontal_index] != 0:
-            return np.array(ret)
-
-        def check(inner_vertical_index, inner_horizontal_index):
-            nonlocal agent_number, ret, save, custom_reversi_board
-            temp = custom_reversi_board[inner_vertical_index][inner_horizontal_index]
-            if temp == agent_number * -1:
-                save.append((inner_vertical_index, inner_horizontal_index))
-                return False
-            elif temp == agent_number:
-                ret.extend(save)
-            return True
-
-        def move_diagonally(move_vertical_value, move_horizontal_value):
-            nonlocal vertical_index, horizontal_index, save
-            save = []
-            move_vertical_index = vertical_index + move_vertical_value
-            move_horizontal_index = horizontal_index + move_horizontal_value
-            while 0 <= move_vertical_index < 8 and 0 <= move_horizontal_index < 8:
-                if check(move_vertical_index, move_horizontal_index):
-                    break
-                move_vertical_index += move_vertical_value
-                move_horizontal_index += move_horizontal_value
-
-        for i in [-1, 0, 1]:
-            for j in [-1, 0, 1]:
-                if i == 0 and j == 0:
-                    continue
-                move_diagonally(i, j)
-
-        return np.array(ret)
+        player, opponent = bit_board.from_reversi_board(agent_number, custom_reversi_board)
+        flips = bit_board.get_flips(vertical_index * 8 + horizontal_index, player, opponent)
+        return np.array(bit_board.to_cells(flips))
 
     def get_reverse_cells(self, vertical_index, horizontal_index, agent_number):
         return self.get_reverse_cells_custom_board(vertical_index, horizontal_index, agent_number, self.__reversi_board)
@@ -73,36 +48,38 @@ class GameBoard(object):
     def get_selectable_cells_custom_board(agent_number, custom_reversi_board):
         if abs(agent_number) != 1:
             raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
-        ret = []
-        for vertical_index in range(0, 8):
-            for horizontal_index in range(0, 8):
-                if len(GameBoard.get_reverse_cells_custom_board(vertical_index, horizontal_index,
-                                                                agent_number, custom_reversi_board)) != 0:
-                    ret.append((vertical_index, horizontal_index))
-        return np.array(ret)
+        player, opponent = bit_board.from_reversi_board(agent_number, custom_reversi_board)
+        return np.array(bit_board.to_cells(bit_board.get_moves(player, opponent)))
 
+    # return is cached, Read Only
     def get_selectable_cells(self, agent_number):
-        return self.get_selectable_cells_custom_board(agent_number, self.__reversi_board)
+        if abs(agent_number) != 1:
+            raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
+        if self.__selectable_cells_cache[agent_number] is None:
+            self.__selectable_cells_cache[agent_number] = self.__search_board.get_selectable_cells(agent_number)
+        return self.__selectable_cells_cache[agent_number]
+
+    def has_legal_move(self, agent_number):
+        if abs(agent_number) != 1:
+            raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
+        if self.__selectable_cells_cache[agent_number] is not None:
+            return len(self.__selectable_cells_cache[agent_number]) != 0
+        return self.__search_board.has_legal_move(agent_number)
 
     @staticmethod
     def count_stones_custom_board(agent_number, custom_reversi_board):
         if abs(agent_number) != 1:
             raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
-        ret = 0
-        for vertical_index in range(0, 8):
-            for horizontal_index in range(0, 8):
-                if custom_reversi_board[vertical_index][horizontal_index] == agent_number:
-                    ret += 1
-        return ret
+        return int(np.count_nonzero(np.asarray(custom_reversi_board) == agent_number))
 
     def count_stones(self, agent_number):
-        return self.count_stones_custom_board(agent_number, self.__reversi_board)
+        return self.__search_board.count_stones(agent_number)
 
     # white win = -1, black win = 1, draw = 2, nothing = 0, abnormal termination = 3
     def check_game_end(self):
         if self.__is_game_end != 0:
             return self.__is_game_end
-        if len(self.get_selectable_cells(1)) != 0 or len(self.get_selectable_cells(-1)) != 0:
+        if self.has_legal_move(1) or self.has_legal_move(-1):
             return 0
         white_stones = self.count_stones(-1)
         black_stones = self.count_stones(1)
@@ -117,42 +94,55 @@ class GameBoard(object):
     # warning, this method is rewrite reversi board (argument). return is change index
     @staticmethod
     def put_stone_custom_board(vertical_index, horizontal_index, agent_number, custom_reversi_board):
+        if abs(agent_number) != 1:
+            raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
+        put_index = vertical_index * 8 + horizontal_index
+        player, opponent = bit_board.from_reversi_board(agent_number, custom_reversi_board)
         ret = [(vertical_index, horizontal_index)]
-        replace_cells = GameBoard.get_reverse_cells_custom_board(
-            vertical_index,
-            horizontal_index,
-            agent_number,
-            custom_reversi_board
-        )
-        custom_reversi_board[vertical_index][horizontal_index] = agent_number
-        for cell in replace_cells:
-            custom_reversi_board[cell[0]][cell[1]] = agent_number
-            ret.append((cell[0], cell[1]))
-        return np.array(ret)
+        ret.extend(bit_board.to_cells(bit_board.get_flips(put_index, player, opponent)))
+        ret = np.array(ret)
+        custom_reversi_board[ret[:, 0], ret[:, 1]] = agent_number
+        return ret
+
+    @staticmethod
+    def calc_zobrist_hash_custom_board(custom_reversi_board):
+        white_bits, black_bits = bit_board.from_reversi_board(-1, custom_reversi_board)
+        return transposition_table.calc_zobrist_hash(black_bits, white_bits)
+
+    # change_cells is return of put_stone_custom_board. same operation for put and undo
+    @staticmethod
+    def update_zobrist_hash_custom_board(zobrist_hash, change_cells, agent_number):
+        zobrist_hash ^= transposition_table.ZOBRIST_KEYS[agent_number][change_cells[0][0] * 8 + change_cells[0][1]]
+        for cell in change_cells[1:]:
+            index = cell[0] * 8 + cell[1]
+            zobrist_hash ^= transposition_table.ZOBRIST_KEYS[agent_number][index]
+            zobrist_hash ^= transposition_table.ZOBRIST_KEYS[-agent_number][index]
+        return zobrist_hash
 
     @staticmethod
     def undo_put_stone_custom_board(change_cells, custom_reversi_board):
         custom_reversi_board[change_cells[0][0]][change_cells[0][1]] = 0
         for cell in change_cells[1:]:
-            custom_reversi_board[cell[0]][cell[1]] *= 1
+            custom_reversi_board[cell[0]][cell[1]] *= -1
 
     def put_stone(self, vertical_index, horizontal_index, agent_number):
-        self.put_stone_custom_board(
-            vertical_index,
-            horizontal_index,
-            agent_number,
-            self.__reversi_board
-        )
+        self.__search_board.make_move(vertical_index, horizontal_index, agent_number)
+        self.__clear_selectable_cells_cache()
+
+    # undo the last put_stone
+    def undo_put_stone(self):
+        self.__search_board.unmake_move()
+        self.__clear_selectable_cells_cache()
 
     def game_start(self, save_data=None):
         self.__init_board()
         self.__first_agent.receive_update_signal()
         self.__second_agent.receive_update_signal()
-        self.__turn_agent_number = -1 if random.randint(0, 2) == 0 else 1
+        self.__turn_agent_number = -1 if random.randint(0, 1) == 0 else 1
         while self.check_game_end() == 0:
             if (not self.__first_agent.is_running) or (not self.__second_agent.is_running):
                 break
-            if len(self.get_selectable_cells(self.__turn_agent_number)) == 0:
+            if not self.has_legal_move(self.__turn_agent_number):
                 self.__turn_agent_number *= -1
                 continue
             if self.__turn_agent_number == -1:
@@ -177,3 +167,163 @@ class GameBoard(object):
     @property
     def turn_agent_number(self):
         return self.__turn_agent_number
+
+    # for runner (headless_runner etc.), 0 is before the first move
+    @turn_agent_number.setter
+    def turn_agent_number(self, value):
+        if abs(value) > 1:
+            raise Exception("Select 1, -1 or 0 for turn agent number.")
+        self.__turn_agent_number = value
+
+    # for runner (headless_runner etc.), initialize board without signals
+    def reset_game(self):
+        self.__init_board()
+        self.__is_game_end = 0
+        self.__turn_agent_number = 0
+
+    @property
+    def first_agent(self):
+        return self.__first_agent
+
+    @property
+    def second_agent(self):
+        return self.__second_agent
+
+    # hash of stones only (xor transposition_table.ZOBRIST_TURN_KEY for the turn if necessary)
+    @property
+    def zobrist_hash(self):
+        return self.__search_board.zobrist_hash
+
+    # return (my bits, enemy bits)
+    def get_bits(self, agent_number):
+        return self.__search_board.get_bits(agent_number)
+
+
+# Reversi board for search and lookahead. make_move / unmake_move without allocating new boards.
+# undo stack is preallocated, one record is (put index, flip bits, agent number)
+class SearchBoard(object):
+    def __init__(self, custom_reversi_board=None, capacity=64):
+        self.__reversi_board = np.zeros(8 * 8).reshape(8, 8)
+        self.__flatten_board = self.__reversi_board.reshape(64)
+        self.__CAPACITY = capacity
+        self.__put_indexes = [0] * capacity
+        self.__flip_bits = [0] * capacity
+        self.__agent_numbers = [0] * capacity
+        self.__stack_size = 0
+        self.__stone_bits = {-1: 0, 1: 0}
+        self.__stone_counts = {-1: 0, 1: 0}
+        self.__zobrist_hash = 0
+        if custom_reversi_board is not None:
+            self.reset(custom_reversi_board)
+
+    @staticmethod
+    def get_initial_reversi_board():
+        ret = np.zeros(8 * 8).reshape(8, 8)
+        ret[3][3] = 1
+        ret[3][4] = -1
+        ret[4][3] = -1
+        ret[4][4] = 1
+        return ret
+
+    # copy custom reversi board and clear undo stack
+    def reset(self, custom_reversi_board):
+        np.copyto(self.__reversi_board, custom_reversi_board)
+        self.__stone_bits[-1], self.__stone_bits[1] = bit_board.from_reversi_board(-1, self.__reversi_board)
+        self.__stone_counts[-1] = bit_board.count_bits(self.__stone_bits[-1])
+        self.__stone_counts[1] = bit_board.count_bits(self.__stone_bits[1])
+        self.__zobrist_hash = transposition_table.calc_zobrist_hash(self.__stone_bits[1], self.__stone_bits[-1])
+        self.__stack_size = 0
+
+    def __apply(self, put_index, flips, agent_number):
+        self.__stone_bits[agent_number] ^= flips | (1 << put_index)
+        self.__stone_bits[-agent_number] ^= flips
+        self.__zobrist_hash = transposition_table.update_zobrist_hash(
+            self.__zobrist_hash,
+            put_index,
+            flips,
+            agent_number
+        )
+
+    # return flip bits
+    def make_move(self, vertical_index, horizontal_index, agent_number):
+        if abs(agent_number) != 1:
+            raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
+        if self.__stack_size == self.__CAPACITY:
+            raise Exception("Undo stack is full.")
+        put_index = int(vertical_index) * 8 + int(horizontal_index)
+        if self.__flatten_board[put_index] != 0:
+            raise Exception("Cannot put a stone on a non-empty cell.")
+        flips = bit_board.get_flips(put_index, self.__stone_bits[agent_number], self.__stone_bits[-agent_number])
+        self.__apply(put_index, flips, agent_number)
+        flip_count = bit_board.count_bits(flips)
+        self.__stone_counts[agent_number] += flip_count + 1
+        self.__stone_counts[-agent_number] -= flip_count
+        self.__flatten_board[put_index] = agent_number
+        for index in bit_board.to_indexes(flips):
+            self.__flatten_board[index] = agent_number
+        self.__put_indexes[self.__stack_size] = put_index
+        self.__flip_bits[self.__stack_size] = flips
+        self.__agent_numbers[self.__stack_size] = agent_number
+        self.__stack_size += 1
+        return flips
+
+    def unmake_move(self):
+        if self.__stack_size == 0:
+            raise Exception("Undo stack is empty.")
+        self.__stack_size -= 1
+        put_index = self.__put_indexes[self.__stack_size]
+        flips = self.__flip_bits[self.__stack_size]
+        agent_number = self.__agent_numbers[self.__stack_size]
+        self.__apply(put_index, flips, agent_number)
+        flip_count = bit_board.count_bits(flips)
+        self.__stone_counts[agent_number] -= flip_count + 1
+        self.__stone_counts[-agent_number] += flip_count
+        self.__flatten_board[put_index] = 0
+        for index in bit_board.to_indexes(flips):
+            self.__flatten_board[index] = -agent_number
+
+    # boards after each move of cells (shape is (len(cells), 8, 8)), the board itself is not changed
+    def get_next_reversi_boards(self, cells, agent_number):
+        ret = np.empty((len(cells), 8, 8))
+        for index, cell in enumerate(cells):
+            self.make_move(cell[0], cell[1], agent_number)
+            ret[index] = self.__reversi_board
+            self.unmake_move()
+        return ret
+
+    def get_selectable_bits(self, agent_number):
+        return bit_board.get_moves(self.__stone_bits[agent_number], self.__stone_bits[-agent_number])
+
+    def get_selectable_cells(self, agent_number):
+        if abs(agent_number) != 1:
+            raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
+        return np.array(bit_board.to_cells(self.get_selectable_bits(agent_number)))
+
+    def has_legal_move(self, agent_number):
+        if abs(agent_number) != 1:
+            raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
+        return bit_board.has_moves(self.__stone_bits[agent_number], self.__stone_bits[-agent_number])
+
+    def count_stones(self, agent_number):
+        if abs(agent_number) != 1:
+            raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
+        return self.__stone_counts[agent_number]
+
+    # return (my bits, enemy bits)
+    def get_bits(self, agent_number):
+        if abs(agent_number) != 1:
+            raise Exception("Select 1 or -1 for Agent Number.(-1: white, 1: black)")
+        return self.__stone_bits[agent_number], self.__stone_bits[-agent_number]
+
+    # Read Only
+    @property
+    def reversi_board(self):
+        return self.__reversi_board
+
+    @property
+    def zobrist_hash(self):
+        return self.__zobrist_hash
+
+    @property
+    def stack_size(self):
+        return self.__stack_size
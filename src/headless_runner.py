@@ -0,0 +1,76 @@
+import collections
+import random
+import time
+import numpy as np
+import game_board
+
+# winner: white win = -1, black win = 1, draw = 2
+# moves: cell index (vertical * 8 + horizontal) of each ply, -1 is pass
+# think_time: total seconds of next_step (white, black)
+GameRecord = collections.namedtuple(
+    "GameRecord",
+    ["winner", "white_stones", "black_stones", "first_turn_agent_number", "moves", "white_think_time",
+     "black_think_time"]
+)
+
+
+# Game runner for non-interactive agents (no control panel check, only the signals the agent needs)
+class HeadlessRunner(object):
+    def __init__(self, first_agent, second_agent):
+        if first_agent.is_lunch_control_panel or second_agent.is_lunch_control_panel:
+            raise Exception("HeadlessRunner does not support an Agent with control panel.")
+        self.__game_board = game_board.GameBoard(first_agent, second_agent)
+        self.__agents = {-1: first_agent, 1: second_agent}
+        self.__update_signal_agents = [now for now in [first_agent, second_agent] if now.need_update_signal]
+        self.__game_end_signal_agents = [now for now in [first_agent, second_agent] if now.need_game_end_signal]
+
+    def __send_update_signal(self):
+        for now_agent in self.__update_signal_agents:
+            now_agent.receive_update_signal()
+
+    def game_start(self):
+        board = self.__game_board
+        board.reset_game()
+        self.__send_update_signal()
+        turn_agent_number = -1 if random.getrandbits(1) == 0 else 1
+        first_turn_agent_number = turn_agent_number
+        board.turn_agent_number = turn_agent_number
+        moves = []
+        think_time = {-1: 0.0, 1: 0.0}
+        while True:
+            if not board.has_legal_move(turn_agent_number):
+                if not board.has_legal_move(turn_agent_number * -1):
+                    break
+                moves.append(-1)
+                turn_agent_number *= -1
+                board.turn_agent_number = turn_agent_number
+                continue
+            start_time = time.perf_counter()
+            select_cell = self.__agents[turn_agent_number].next_step()
+            think_time[turn_agent_number] += time.perf_counter() - start_time
+            board.put_stone(select_cell[0], select_cell[1], turn_agent_number)
+            moves.append(int(select_cell[0]) * 8 + int(select_cell[1]))
+            self.__send_update_signal()
+            turn_agent_number *= -1
+            board.turn_agent_number = turn_agent_number
+        winner = board.check_game_end()
+        for now_agent in self.__game_end_signal_agents:
+            now_agent.receive_game_end_signal()
+        return GameRecord(
+            winner,
+            board.count_stones(-1),
+            board.count_stones(1),
+            first_turn_agent_number,
+            np.array(moves, dtype=np.int8),
+            think_time[-1],
+            think_time[1]
+        )
+
+    @property
+    def game_board(self):
+        return self.__game_board
+
+
+def play_games(times, first_agent, second_agent):
+    runner = HeadlessRunner(first_agent, second_agent)
+    return [runner.game_start() for index in range(0, times)]
@@ -1,16 +1,28 @@
 import game_board
+import batch_game_board
+import headless_runner
+import fitness_cache
+import checkpoint
+import replay_memory
 import agent
 import random
 import tqdm
 import numpy as np
 import concurrent.futures
+import multiprocessing
+import queue
+import traceback
+from multiprocessing import shared_memory
 
 
 class GALearning:
-    def __init__(self, evolve_times):
+    def __init__(self, evolve_times, cache=None):
         self.__NUMBER_INDIVIDUALS = 20  # more than 10
         self.__NUMBER_BATTLES = 40
+        # games added to a cached genome (elite) in each generation, the fitness becomes more accurate
+        self.__NUMBER_EXTRA_BATTLES = 10
         self.__EVOLVE_TIMES = evolve_times
+        self.__fitness_cache = fitness_cache.FitnessCache() if cache is None else cache
         self.__now_generation = []
         self.__progress_bar = None
         self.__data_generation_average = []
@@ -18,23 +30,32 @@ class GALearning:
             self.__now_generation.append([agent.GABoardAgent(), 0])
             self.__now_generation[number][0].set_random_evaluation_board()
 
-    # calc expectation value
+    # calc expectation value (elites and duplicates reuse the results of fitness cache and play extra games)
     def __battle_random_agent(self):
-        executor = concurrent.futures.ProcessPoolExecutor()
         for index in range(0, self.__NUMBER_INDIVIDUALS):
-            waiting_queue = []
-            for times in range(0, self.__NUMBER_BATTLES):
-                first = self.__now_generation[index][0].copy()
-                second = agent.RandomAgent()
-                game = game_board.GameBoard(first, second)
-                waiting_queue.append(executor.submit(game.game_start))
-            for end_task in concurrent.futures.as_completed(waiting_queue):
-                self.__progress_bar.update(1)
-                if end_task.result() == -1:
-                    self.__now_generation[index][1] += 2
-                elif end_task.result() == 2:
-                    self.__now_generation[index][1] += 1
-        executor.shutdown()
+            key = self.__now_generation[index][0].genome_key("random")
+            record = self.__fitness_cache.get(key)
+            if record is None:
+                battle_times = self.__NUMBER_BATTLES
+            else:
+                battle_times = max(self.__NUMBER_BATTLES - record[2], self.__NUMBER_EXTRA_BATTLES)
+            if battle_times > 0:
+                game = batch_game_board.BatchGameBoard(
+                    self.__now_generation[index][0],
+                    agent.RandomAgent(),
+                    battle_times
+                )
+                game_results = game.game_start()
+                self.__fitness_cache.add(
+                    key,
+                    int(np.count_nonzero(game_results == -1)),
+                    int(np.count_nonzero(game_results == 2)),
+                    battle_times
+                )
+                record = self.__fitness_cache.get(key)
+            # same scale as NUMBER_BATTLES games (win = 2, draw = 1)
+            self.__now_generation[index][1] = (2 * record[0] + record[1]) * self.__NUMBER_BATTLES / record[2]
+            self.__progress_bar.update(self.__NUMBER_BATTLES)
 
     def __generation_sort(self):
         self.__now_generation.sort(key=lambda x: x[1], reverse=True)
@@ -78,6 +99,8 @@ class GALearning:
             self.__data_generation_average.append(self.__calc_generation_average())
             if times % save_interval == 0:
                 self.__now_generation[0][0].save_evaluation_board(file_path + str(times))
+        if self.__fitness_cache.file_path is not None:
+            self.__fitness_cache.save()
         self.__progress_bar.close()
 
 
@@ -104,9 +127,8 @@ class QLearning:
                 second = second_agent
             else:
                 second = second_agent.copy()
-            game = game_board.GameBoard(first, second)
-            game.game_start()
-            self.__learning_data.append([game.count_stones(-1), game.count_stones(1)])
+            game_record = headless_runner.HeadlessRunner(first, second).game_start()
+            self.__learning_data.append([game_record.white_stones, game_record.black_stones])
             if times % save_interval == 0:
                 if isinstance(first_agent, agent.QLeaningAgent):
                     first_agent.save_weight_vector(file_path + str(times))
@@ -116,11 +138,144 @@ class QLearning:
         self.__progress_bar.close()
 
 
+# play games of worker process with shared weight vector
+def _run_q_learning_worker(worker_id, times, shared_vector, mode, merge_interval, merge_lock, merge_rate,
+                           opponent_agent, result_queue):
+    if mode == "hogwild":
+        weight_vector = shared_vector
+    else:
+        weight_vector = shared_vector.copy()
+    base_vector = weight_vector.copy()
+    first_agent = agent.QLeaningAgent(True)
+    first_agent.set_weight_vector(weight_vector)
+    if opponent_agent is None:
+        second_agent = agent.QLeaningAgent(True)
+        second_agent.set_weight_vector(weight_vector)
+    else:
+        second_agent = opponent_agent
+    runner = headless_runner.HeadlessRunner(first_agent, second_agent)
+    for now_times in range(1, times + 1):
+        game_record = runner.game_start()
+        if mode == "merge" and (now_times % merge_interval == 0 or now_times == times):
+            # add the difference of this worker (average of workers) and take the updates of other workers
+            with merge_lock:
+                shared_vector += merge_rate * (weight_vector - base_vector)
+                weight_vector[:] = shared_vector
+            base_vector[:] = weight_vector
+        result_queue.put((worker_id, game_record.white_stones, game_record.black_stones))
+
+
+def _q_learning_worker(worker_id, times, shared_memory_name, mode, merge_interval, merge_lock, merge_rate,
+                       opponent_agent, result_queue, seed):
+    random.seed(seed)
+    np.random.seed(seed % (2 ** 32))
+    shared_weight = shared_memory.SharedMemory(name=shared_memory_name)
+    shared_vector = np.ndarray((agent.QLeaningAgent.FEATURE_SIZE,), dtype=np.float64, buffer=shared_weight.buf)
+    try:
+        _run_q_learning_worker(
+            worker_id,
+            times,
+            shared_vector,
+            mode,
+            merge_interval,
+            merge_lock,
+            merge_rate,
+            opponent_agent,
+            result_queue
+        )
+    except BaseException as exception:
+        # the frames of traceback refer to the view of shared memory (close raises BufferError)
+        traceback.clear_frames(exception.__traceback__)
+        raise
+    finally:
+        del shared_vector
+        shared_weight.close()
+
+
+# Worker processes learn one weight vector on shared memory
+# mode "hogwild": lock-free TD update, "merge": add average of local updates every merge_interval games
+class ParallelQLearning:
+    MODES = ["hogwild", "merge"]
+
+    def __init__(self, evolve_times, number_workers=4, mode="hogwild", merge_interval=10):
+        if mode not in self.MODES:
+            raise Exception("Select mode from " + str(self.MODES))
+        if number_workers <= 0:
+            raise Exception("Number of workers must be positive.")
+        self.__EVOLVE_TIMES = evolve_times
+        self.__NUMBER_WORKERS = number_workers
+        self.__MODE = mode
+        self.__MERGE_INTERVAL = merge_interval
+        self.__progress_bar = None
+        # [worker id, white stones, black stones] of each game
+        self.__learning_data = []
+
+    def save_data_trajectory(self, file_path):
+        np.save(file_path, np.array(self.__learning_data))
+
+    # return [white stones, black stones] of each game of the worker
+    def get_data_trajectory(self, worker_id):
+        return [data[1:] for data in self.__learning_data if data[0] == worker_id]
+
+    # learning_agent has the initial weight and the result. opponent_agent is None: self-play
+    def start(self, file_path, save_interval, learning_agent, opponent_agent=None):
+        if not isinstance(learning_agent, agent.QLeaningAgent):
+            raise Exception("The object of learning must be a QLeaningAgent.")
+        if opponent_agent is not None and not isinstance(opponent_agent, agent.Agent):
+            raise Exception("The object of learning must be an Agent Class.")
+        shared_weight = shared_memory.SharedMemory(create=True, size=learning_agent.weight_vector.nbytes)
+        shared_vector = np.ndarray((agent.QLeaningAgent.FEATURE_SIZE,), dtype=np.float64, buffer=shared_weight.buf)
+        shared_vector[:] = learning_agent.weight_vector
+        merge_lock = multiprocessing.Lock()
+        result_queue = multiprocessing.Queue()
+        self.__progress_bar = tqdm.tqdm(total=self.__EVOLVE_TIMES)
+        self.__progress_bar.set_description('learning ' + str(self.__EVOLVE_TIMES) + ' times...')
+        workers = []
+        try:
+            for worker_id in range(0, self.__NUMBER_WORKERS):
+                worker_times = self.__EVOLVE_TIMES // self.__NUMBER_WORKERS
+                if worker_id < self.__EVOLVE_TIMES % self.__NUMBER_WORKERS:
+                    worker_times += 1
+                workers.append(multiprocessing.Process(
+                    target=_q_learning_worker,
+                    args=(worker_id, worker_times, shared_weight.name, self.__MODE, self.__MERGE_INTERVAL, merge_lock,
+                          1.0 / self.__NUMBER_WORKERS, opponent_agent, result_queue, random.getrandbits(64)),
+                    daemon=True
+                ))
+                workers[-1].start()
+            for times in range(1, self.__EVOLVE_TIMES + 1):
+                while True:
+                    try:
+                        self.__learning_data.append(list(result_queue.get(timeout=1.0)))
+                        break
+                    except queue.Empty:
+                        if not any(worker.is_alive() for worker in workers):
+                            raise Exception("Worker process stopped before the end of learning.")
+                if times % save_interval == 0:
+                    learning_agent.set_weight_vector(shared_vector.copy())
+                    learning_agent.save_weight_vector(file_path + str(times))
+                self.__progress_bar.update(1)
+            for worker in workers:
+                worker.join()
+            learning_agent.set_weight_vector(shared_vector.copy())
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            del shared_vector
+            shared_weight.close()
+            shared_weight.unlink()
+            self.__progress_bar.close()
+
+
 class NNGALearning:
-    def __init__(self, evolve_times, is_ReLU, number_individuals, number_mutation):
+    def __init__(self, evolve_times, is_ReLU, number_individuals, number_mutation, cache=None):
         self.__NUMBER_INDIVIDUALS = number_individuals  # more than 10
         self.__NUMBER_MUTATION = number_mutation  # more than 2
+        # games added to a cached genome (elite) in each generation, the fitness becomes more accurate
+        self.__NUMBER_EXTRA_BATTLES = max(1, number_individuals // 4)
         self.__EVOLVE_TIMES = evolve_times
+        self.__fitness_cache = fitness_cache.FitnessCache() if cache is None else cache
         self.__now_generation = []
         self.__data_generation_average = []
         self.__executor = concurrent.futures.ProcessPoolExecutor()
@@ -144,10 +299,30 @@ class NNGALearning:
             elif end_task.result()[0] == 1:
                 self.__now_generation[end_task.result()[1][1]][1] += 1
 
+    # elites and duplicates reuse the results of fitness cache and play extra games
     def __battle_random_agent(self, partner, is_first):
+        if hasattr(partner, "genome_key"):
+            context = partner.genome_key(is_first)
+        else:
+            context = partner.agent_name + str(is_first)
+        keys = [self.__now_generation[index][0].genome_key(context) for index in range(0, self.__NUMBER_INDIVIDUALS)]
+        results = {}
+        # games counted in progress bar (NUMBER_INDIVIDUALS games of each individual)
+        progress_times = {}
         waiting_queue = []
         for index in range(0, self.__NUMBER_INDIVIDUALS):
-            for times in range(0, self.__NUMBER_INDIVIDUALS):
+            if keys[index] in results:
+                battle_times = 0
+            else:
+                record = self.__fitness_cache.get(keys[index])
+                if record is None:
+                    battle_times = self.__NUMBER_INDIVIDUALS
+                else:
+                    battle_times = max(self.__NUMBER_INDIVIDUALS - record[2], self.__NUMBER_EXTRA_BATTLES)
+                results[keys[index]] = [0, 0, battle_times]
+                progress_times[keys[index]] = min(battle_times, self.__NUMBER_INDIVIDUALS)
+            self.__progress_bar.update(self.__NUMBER_INDIVIDUALS - min(battle_times, self.__NUMBER_INDIVIDUALS))
+            for times in range(0, battle_times):
                 if is_first:
                     first = self.__now_generation[index][0].copy()
                     second = partner.copy()
@@ -155,13 +330,23 @@ class NNGALearning:
                     first = partner.copy()
                     second = self.__now_generation[index][0].copy()
                 game = game_board.GameBoard(first, second)
-                waiting_queue.append(self.__executor.submit(game.game_start, index))
+                waiting_queue.append(self.__executor.submit(game.game_start, keys[index]))
         for end_task in concurrent.futures.as_completed(waiting_queue):
-            self.__progress_bar.update(1)
-            if end_task.result()[0] == -1 and is_first:
-                self.__now_generation[end_task.result()[1]][1] += 1
-            elif end_task.result()[0] == 1 and not is_first:
-                self.__now_generation[end_task.result()[1]][1] += 1
+            game_result, key = end_task.result()
+            if progress_times[key] > 0:
+                progress_times[key] -= 1
+                self.__progress_bar.update(1)
+            if game_result == 2:
+                results[key][1] += 1
+            elif (game_result == -1 and is_first) or (game_result == 1 and not is_first):
+                results[key][0] += 1
+        for key, result in results.items():
+            if result[2] > 0:
+                self.__fitness_cache.add(key, result[0], result[1], result[2])
+        for index in range(0, self.__NUMBER_INDIVIDUALS):
+            record = self.__fitness_cache.get(keys[index])
+            # same scale as NUMBER_INDIVIDUALS games (win = 1)
+            self.__now_generation[index][1] = record[0] * self.__NUMBER_INDIVIDUALS / record[2]
 
     def __generation_sort(self):
         self.__now_generation.sort(key=lambda x: x[1], reverse=True)
@@ -206,29 +391,165 @@ class NNGALearning:
             self.__data_generation_average.append(self.__calc_generation_average())
             if times % save_interval == 0:
                 self.__now_generation[0][0].save_weight_vector(file_path + str(times))
+        if self.__fitness_cache.file_path is not None:
+            self.__fitness_cache.save()
         self.__executor.shutdown()
         self.__progress_bar.close()
 
 
 class DQNLearning:
-    def __init__(self, evolve_times):
+    # tau is not None: soft update of target network, max_to_keep is None: keep all saved models
+    def __init__(self, evolve_times, tau=None, max_to_keep=None):
         self.__EVOLVE_TIMES = evolve_times
+        self.__TAU = tau
+        self.__MAX_TO_KEEP = max_to_keep
         self.__progress_bar = None
 
     def start(self, file_path, save_interval, first_agent, second_agent):
         self.__progress_bar = tqdm.tqdm(total=self.__EVOLVE_TIMES)
         self.__progress_bar.set_description('learning ' + str(self.__EVOLVE_TIMES) + ' times...')
-        for times in range(1, self.__EVOLVE_TIMES + 1):
-            game = game_board.GameBoard(first_agent,second_agent)
-            game.game_start()
-            if isinstance(first_agent, agent.DQNAgent):
-                first_agent.weight_copy()
-            if isinstance(second_agent, agent.DQNAgent):
-                second_agent.weight_copy()
-            if times % save_interval == 0:
+        # one manager of each checkpoint series (max_to_keep of each agent)
+        first_checkpoint_manager = checkpoint.CheckpointManager(agent.DQNAgent.write_model, self.__MAX_TO_KEEP)
+        second_checkpoint_manager = checkpoint.CheckpointManager(agent.DQNAgent.write_model, self.__MAX_TO_KEEP)
+        try:
+            for times in range(1, self.__EVOLVE_TIMES + 1):
+                headless_runner.HeadlessRunner(first_agent, second_agent).game_start()
                 if isinstance(first_agent, agent.DQNAgent):
-                    first_agent.save(file_path + str(times))
+                    first_agent.weight_copy(self.__TAU)
                 if isinstance(second_agent, agent.DQNAgent):
-                    second_agent.save(file_path + str(times) + "-rev")
-            self.__progress_bar.update(1)
+                    second_agent.weight_copy(self.__TAU)
+                if times % save_interval == 0:
+                    if isinstance(first_agent, agent.DQNAgent):
+                        first_checkpoint_manager.save(file_path + str(times), first_agent.get_weights())
+                    if isinstance(second_agent, agent.DQNAgent):
+                        second_checkpoint_manager.save(file_path + str(times) + "-rev", second_agent.get_weights())
+                self.__progress_bar.update(1)
+        finally:
+            try:
+                first_checkpoint_manager.close()
+            finally:
+                second_checkpoint_manager.close()
         self.__progress_bar.close()
+
+
+# actor process of ParallelDQNLearning. weight_store is {"version": int, "weights": list of arrays}
+def _dqn_actor(actor_id, times, parameters, opponent_agent, transition_queue, weight_store, refresh_interval, seed):
+    random.seed(seed)
+    np.random.seed(seed % (2 ** 32))
+    batch_size, epsilon, gamma = parameters
+    sender = replay_memory.TransitionSender(transition_queue)
+    first_agent = agent.DQNAgent(True, batch_size, epsilon, gamma, sender, False)
+    if opponent_agent is None:
+        # self-play, both agents use the same target network
+        second_agent = agent.DQNAgent(True, batch_size, epsilon, gamma, sender, False)
+    else:
+        second_agent = opponent_agent
+    dqn_agents = [now for now in [first_agent, second_agent] if isinstance(now, agent.DQNAgent)]
+    runner = headless_runner.HeadlessRunner(first_agent, second_agent)
+    now_version = -1
+    for now_times in range(0, times):
+        if now_times % refresh_interval == 0 and weight_store["version"] != now_version:
+            now_version = weight_store["version"]
+            weights = weight_store["weights"]
+            for dqn_agent in dqn_agents:
+                dqn_agent.set_weights(weights)
+        runner.game_start()
+        sender.flush()
+        transition_queue.put(("game", actor_id))
+    transition_queue.put(("end", actor_id))
+
+
+# Actor processes play games with the target network and send transitions,
+# the learner (this process) trains q network continuously and publishes the target network
+class ParallelDQNLearning:
+    def __init__(self, evolve_times, batch_size, epsilon, gamma, number_actors=4, refresh_interval=10,
+                 target_update_interval=200, memory_capacity=100000, tau=None, max_to_keep=None):
+        if number_actors <= 0:
+            raise Exception("Number of actors must be positive.")
+        self.__EVOLVE_TIMES = evolve_times
+        self.__BATCH_SIZE = batch_size
+        self.__EPSILON = epsilon
+        self.__GAMMA = gamma
+        self.__NUMBER_ACTORS = number_actors
+        self.__REFRESH_INTERVAL = refresh_interval  # games of actor
+        self.__TARGET_UPDATE_INTERVAL = target_update_interval  # training steps of learner
+        self.__MEMORY_CAPACITY = memory_capacity
+        self.__TAU = tau
+        self.__MAX_TO_KEEP = max_to_keep
+        self.__train_count = 0
+        self.__progress_bar = None
+
+    def __publish(self, learner_agent, weight_store):
+        learner_agent.weight_copy(self.__TAU)
+        weight_store["weights"] = learner_agent.get_weights()
+        weight_store["version"] += 1
+
+    # opponent_agent is None: self-play. return learner DQNAgent
+    def start(self, file_path, save_interval, opponent_agent=None, memory=None):
+        if memory is None:
+            memory = replay_memory.ReplayMemory(self.__MEMORY_CAPACITY)
+        learner_agent = agent.DQNAgent(True, self.__BATCH_SIZE, self.__EPSILON, self.__GAMMA, memory)
+        # TensorFlow is not fork-safe
+        context = multiprocessing.get_context("spawn")
+        manager = context.Manager()
+        transition_queue = context.Queue()
+        weight_store = manager.dict()
+        weight_store["version"] = 0
+        weight_store["weights"] = learner_agent.get_weights()
+        checkpoint_manager = checkpoint.CheckpointManager(agent.DQNAgent.write_model, self.__MAX_TO_KEEP)
+        self.__progress_bar = tqdm.tqdm(total=self.__EVOLVE_TIMES)
+        self.__progress_bar.set_description('learning ' + str(self.__EVOLVE_TIMES) + ' times...')
+        actors = []
+        try:
+            for actor_id in range(0, self.__NUMBER_ACTORS):
+                actor_times = self.__EVOLVE_TIMES // self.__NUMBER_ACTORS
+                if actor_id < self.__EVOLVE_TIMES % self.__NUMBER_ACTORS:
+                    actor_times += 1
+                actors.append(context.Process(
+                    target=_dqn_actor,
+                    args=(actor_id, actor_times, (self.__BATCH_SIZE, self.__EPSILON, self.__GAMMA), opponent_agent,
+                          transition_queue, weight_store, self.__REFRESH_INTERVAL, random.getrandbits(64)),
+                    daemon=True
+                ))
+                actors[-1].start()
+            game_count = 0
+            end_count = 0
+            while end_count < self.__NUMBER_ACTORS:
+                # receive all messages, wait only when there is nothing to train
+                is_wait = len(memory) < self.__BATCH_SIZE
+                while True:
+                    try:
+                        message = transition_queue.get(timeout=1.0) if is_wait else transition_queue.get_nowait()
+                    except queue.Empty:
+                        if is_wait and not any(actor.is_alive() for actor in actors):
+                            raise Exception("Actor process stopped before the end of learning.")
+                        break
+                    is_wait = False
+                    if message[0] == "transitions":
+                        memory.add_batch(message[1], message[2], message[3])
+                    elif message[0] == "game":
+                        game_count += 1
+                        self.__progress_bar.update(1)
+                        if game_count % save_interval == 0:
+                            checkpoint_manager.save(file_path + str(game_count), learner_agent.get_weights())
+                    else:
+                        end_count += 1
+                if learner_agent.train_step():
+                    self.__train_count += 1
+                    if self.__train_count % self.__TARGET_UPDATE_INTERVAL == 0:
+                        self.__publish(learner_agent, weight_store)
+            self.__publish(learner_agent, weight_store)
+            for actor in actors:
+                actor.join()
+        finally:
+            for actor in actors:
+                if actor.is_alive():
+                    actor.terminate()
+            checkpoint_manager.close()
+            manager.shutdown()
+            self.__progress_bar.close()
+        return learner_agent
+
+    @property
+    def train_count(self):
+        return self.__train_count
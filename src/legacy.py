@@ -13,18 +13,26 @@ class NeuralNetworkGALeaningAgent(agent.Agent):
         self.__middle_one_weight = np.random.rand(100, 50)
         self.__middle_two_weight = np.random.rand(50, 20)
         self.__output_weight = np.random.rand(20, 1)
+        self.__search_board = game_board.SearchBoard()
+
+    # next_step does not use the vector of receive_update_signal
+    @property
+    def need_update_signal(self):
+        return False
+
+    @property
+    def need_game_end_signal(self):
+        return False
 
     # under about Neural Network
     @staticmethod
     def sigmoid(x):
         return (np.tanh(x / 2) + 1) / 2
 
-    # forward propagation
-    def forward(self):
-        # input layer
-        now_layer = copy.deepcopy(self.__now_vector)
+    # forward propagation of each row of vectors
+    def __forward_batch(self, vectors):
         # first middle layer
-        now_layer = np.dot(now_layer, self.__input_weight)
+        now_layer = np.dot(vectors, self.__input_weight)
         now_layer = self.sigmoid(now_layer)
         # second middle layer
         now_layer = np.dot(now_layer, self.__middle_one_weight)
@@ -34,13 +42,17 @@ class NeuralNetworkGALeaningAgent(agent.Agent):
         now_layer = self.sigmoid(now_layer)
         # output layer
         now_layer = np.dot(now_layer, self.__output_weight)
-        return now_layer[0]
+        return now_layer[:, 0]
+
+    # forward propagation
+    def forward(self):
+        return self.__forward_batch(self.__now_vector.reshape(1, -1))[0]
 
     # end Neural Network
 
     @staticmethod
     def __generate_vector_from_custom_board(agent_number, custom_reversi_board):
-        vector = custom_reversi_board.reshape(64)
+        vector = custom_reversi_board.reshape(64).copy()
         # my_stones = game_board.GameBoard.count_stones_custom_board(agent_number, custom_reversi_board)
         # enemy_stones = game_board.GameBoard.count_stones_custom_board(agent_number * -1, custom_reversi_board)
         # add_vector = np.array([my_stones - enemy_stones, 64 - my_stones - enemy_stones])
@@ -63,28 +75,18 @@ class NeuralNetworkGALeaningAgent(agent.Agent):
 
     def next_step(self):
         selectable_cells = self.belong_game_board.get_selectable_cells(self.agent_number)
-        ret = 0
-        max_value = -10000
-        reversi_board = copy.deepcopy(self.belong_game_board.reversi_board)
-        for index, cell in enumerate(selectable_cells):
-            change_cells = game_board.GameBoard.put_stone_custom_board(
-                cell[0],
-                cell[1],
-                self.agent_number,
-                reversi_board
-            )
-            self.__now_vector = self.__generate_vector_from_custom_board(
-                self.agent_number,
-                reversi_board
-            )
-            calc_value = self.forward()
-            if max_value < calc_value:
-                ret = index
-                max_value = calc_value
-            reversi_board[change_cells[0][0], change_cells[0][1]] = 0
-            for change_cell in change_cells[1:]:
-                reversi_board[change_cell[0]][change_cell[1]] = self.agent_number * -1
-        return selectable_cells[ret]
+        self.__search_board.reset(self.belong_game_board.reversi_board)
+        next_reversi_boards = self.__search_board.get_next_reversi_boards(selectable_cells, self.agent_number)
+        return selectable_cells[int(np.argmax(self.evaluate_batch(next_reversi_boards)))]
+
+    # evaluate boards (shape is (N, 8, 8)) with one forward propagation. agent_number is None: own agent number
+    def evaluate_batch(self, custom_reversi_boards, agent_number=None):
+        if agent_number is None:
+            agent_number = self.agent_number
+        vectors = np.array(custom_reversi_boards, dtype=np.float64).reshape(-1, 64)
+        if agent_number == 1:
+            vectors *= -1
+        return self.__forward_batch(vectors)
 
     def __get_all_weight_array(self):
         return [self.__input_weight, self.__middle_one_weight, self.__middle_two_weight, self.__output_weight]
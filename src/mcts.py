@@ -0,0 +1,350 @@
+import concurrent.futures
+import math
+import os
+import random
+import time
+import numpy as np
+import agent
+import bit_board
+
+
+# Node of search tree. player / opponent are bits of the turn agent (agent_number) of this node
+# value_sum is from the side of the agent who moved to this node (-agent_number), move -1 is pass
+class MCTSNode(object):
+    def __init__(self, agent_number, player, opponent, move=-1, prior=1.0):
+        self.agent_number = agent_number
+        self.player = player
+        self.opponent = opponent
+        self.move = move
+        self.prior = prior
+        self.children = None
+        self.visits = 0
+        self.value_sum = 0.0
+
+    # return (black bits, white bits)
+    def get_stone_bits(self):
+        if self.agent_number == 1:
+            return self.player, self.opponent
+        return self.opponent, self.player
+
+
+# UCT search tree (selection with progressive bias of prior, random playout or value evaluator on leaf)
+# prior_evaluator / value_evaluator(agent_number, custom_reversi_board) is the value from agent_number side
+# (GABoardAgent.evaluate_custom_board, NeuralNetworkGALeaningAgent.evaluate_custom_board etc.)
+class MCTSTree(object):
+    def __init__(self, exploration=1.4, prior_evaluator=None, prior_temperature=1.0, prior_weight=1.0,
+                 value_evaluator=None, value_scale=1.0):
+        self.__EXPLORATION = exploration
+        self.__prior_evaluator = prior_evaluator
+        self.__PRIOR_TEMPERATURE = prior_temperature
+        self.__PRIOR_WEIGHT = prior_weight
+        self.__value_evaluator = value_evaluator
+        self.__VALUE_SCALE = value_scale
+        self.__evaluation_board = np.zeros(8 * 8).reshape(8, 8)
+        self.__root = None
+        self.__reused_visits = 0
+
+    # descendant (until max_depth) of the stones, None if it is not in the tree
+    def __find_node(self, black, white, agent_number=None, max_depth=2):
+        nodes = [self.__root]
+        for depth in range(0, max_depth + 1):
+            next_nodes = []
+            for node in nodes:
+                if node.get_stone_bits() == (black, white) and agent_number in (None, node.agent_number):
+                    return node
+                if node.children is not None:
+                    next_nodes.extend(node.children)
+            nodes = next_nodes
+        return None
+
+    # reuse the subtree of the position if it is in the tree
+    def set_root(self, agent_number, player, opponent):
+        node = None
+        if self.__root is not None:
+            black, white = (player, opponent) if agent_number == 1 else (opponent, player)
+            node = self.__find_node(black, white, agent_number)
+        if node is None:
+            node = MCTSNode(agent_number, player, opponent)
+        self.__root = node
+        self.__reused_visits = node.visits
+
+    # follow the move (own move or reply of the opponent), the other subtrees are released
+    def advance(self, black, white):
+        if self.__root is None:
+            return
+        self.__root = self.__find_node(black, white)
+
+    def clear(self):
+        self.__root = None
+
+    def __expand(self, node):
+        node.children = []
+        player = node.player
+        opponent = node.opponent
+        moves_bits = bit_board.get_moves(player, opponent)
+        if moves_bits == 0:
+            if bit_board.has_moves(opponent, player):
+                node.children.append(MCTSNode(-node.agent_number, opponent, player))
+            return
+        for index in bit_board.to_indexes(moves_bits):
+            flips = bit_board.get_flips(index, player, opponent)
+            node.children.append(MCTSNode(-node.agent_number, opponent & ~flips, player | flips | (1 << index), index))
+        if self.__prior_evaluator is None:
+            random.shuffle(node.children)
+            return
+        values = np.array([
+            self.__prior_evaluator(node.agent_number, bit_board.to_reversi_board(
+                node.agent_number, child.opponent, child.player, self.__evaluation_board
+            ))
+            for child in node.children
+        ]) / self.__PRIOR_TEMPERATURE
+        priors = np.exp(values - values.max())
+        priors /= priors.sum()
+        for child, prior in zip(node.children, priors):
+            child.prior = float(prior)
+
+    def __select(self, node):
+        log_visits = math.log(node.visits + 1)
+        best_child = None
+        best_score = -math.inf
+        for child in node.children:
+            if child.visits == 0:
+                # unvisited child first (higher prior first)
+                score = 1e9 + child.prior
+            else:
+                score = child.value_sum / child.visits + self.__EXPLORATION * math.sqrt(log_visits / child.visits) \
+                        + self.__PRIOR_WEIGHT * child.prior / (child.visits + 1)
+            if best_score < score:
+                best_score = score
+                best_child = child
+        return best_child
+
+    # result of black side (1: black win, 0: draw, -1: white win)
+    @staticmethod
+    def __end_value(agent_number, player, opponent):
+        difference = (bit_board.count_bits(player) - bit_board.count_bits(opponent)) * agent_number
+        return (difference > 0) - (difference < 0)
+
+    @classmethod
+    def __playout(cls, agent_number, player, opponent):
+        while True:
+            moves_bits = bit_board.get_moves(player, opponent)
+            if moves_bits == 0:
+                if not bit_board.has_moves(opponent, player):
+                    return cls.__end_value(agent_number, player, opponent)
+            else:
+                index = random.choice(bit_board.to_indexes(moves_bits))
+                flips = bit_board.get_flips(index, player, opponent)
+                player |= flips | (1 << index)
+                opponent &= ~flips
+            player, opponent = opponent, player
+            agent_number = -agent_number
+
+    # value of black side in [-1, 1]
+    def __evaluate(self, node):
+        if self.__value_evaluator is None:
+            return self.__playout(node.agent_number, node.player, node.opponent)
+        if not bit_board.has_moves(node.player, node.opponent) and not bit_board.has_moves(node.opponent, node.player):
+            return self.__end_value(node.agent_number, node.player, node.opponent)
+        value = self.__value_evaluator(node.agent_number, bit_board.to_reversi_board(
+            node.agent_number, node.player, node.opponent, self.__evaluation_board
+        ))
+        return math.tanh(value / self.__VALUE_SCALE) * node.agent_number
+
+    # one selection, expansion, evaluation and backpropagation
+    def __run_playout(self):
+        node = self.__root
+        path = [node]
+        # evaluate a new node on the first visit
+        while node.visits != 0 or len(path) == 1:
+            if node.children is None:
+                self.__expand(node)
+            if len(node.children) == 0:
+                break
+            node = self.__select(node)
+            path.append(node)
+        value = self.__evaluate(node)
+        for node in path:
+            node.visits += 1
+            node.value_sum -= value * node.agent_number
+
+    # playout_limit / time_limit is None: no limit of the number / seconds. return number of playouts
+    def search(self, playout_limit=None, time_limit=None):
+        if self.__root is None:
+            raise Exception("Must set root of MCTSTree")
+        if playout_limit is None and time_limit is None:
+            raise Exception("Set playout limit or time limit.")
+        deadline = math.inf if time_limit is None else time.perf_counter() + time_limit
+        ret = 0
+        # at least one playout (the root children are expanded)
+        while ret == 0 or ((playout_limit is None or ret < playout_limit) and time.perf_counter() < deadline):
+            self.__run_playout()
+            ret += 1
+        return ret
+
+    # return {move index: (visits, value sum)} of root children
+    def get_root_statistics(self):
+        if self.__root is None or self.__root.children is None:
+            return {}
+        return {child.move: (child.visits, child.value_sum) for child in self.__root.children}
+
+    @property
+    def root(self):
+        return self.__root
+
+    # visits of the root given by the subtree of previous search
+    @property
+    def reused_visits(self):
+        return self.__reused_visits
+
+
+# tree of each worker process (the subtree is reused when the worker searched the previous position)
+_worker_tree = None
+# the tree is cleared when a new game starts
+_worker_game_number = 0
+
+
+def _init_mcts_worker(tree_parameters):
+    global _worker_tree
+    _worker_tree = MCTSTree(*tree_parameters)
+
+
+# return (process id, root statistics of the worker tree, number of playouts)
+# root statistics include the visits of reused subtree and the other search of this worker in the same move
+def _mcts_search(game_number, agent_number, player, opponent, playout_limit, time_limit, is_reuse_tree, seed):
+    global _worker_game_number
+    random.seed(seed)
+    if game_number != _worker_game_number or not is_reuse_tree:
+        _worker_tree.clear()
+        _worker_game_number = game_number
+    _worker_tree.set_root(agent_number, player, opponent)
+    playout_count = _worker_tree.search(playout_limit, time_limit)
+    return os.getpid(), _worker_tree.get_root_statistics(), playout_count
+
+
+# Monte Carlo tree search (UCT). the move of most visits is selected
+# number_workers > 1: root parallelization, each worker process searches its own tree and root statistics are merged
+# (playout_limit is divided by the workers). the process pool is kept until close (or the end of with statement)
+class MCTSAgent(agent.Agent):
+    def __init__(self, playout_limit=1000, time_limit=None, number_workers=1, exploration=1.4, prior_evaluator=None,
+                 prior_temperature=1.0, prior_weight=1.0, value_evaluator=None, value_scale=1.0, is_reuse_tree=True):
+        if playout_limit is None and time_limit is None:
+            raise Exception("Set playout limit or time limit.")
+        if number_workers <= 0:
+            raise Exception("Number of workers must be positive.")
+        super().__init__("MCTS", False)
+        self.__PLAYOUT_LIMIT = playout_limit
+        self.__TIME_LIMIT = time_limit
+        self.__NUMBER_WORKERS = number_workers
+        self.__tree_parameters = (exploration, prior_evaluator, prior_temperature, prior_weight, value_evaluator,
+                                  value_scale)
+        self.__IS_REUSE_TREE = is_reuse_tree
+        self.__tree = MCTSTree(*self.__tree_parameters)
+        self.__executor = None
+        self.__game_number = 0
+        self.__playout_count = 0
+        self.__search_seconds = 0.0
+
+    def __get_parameters(self):
+        return (self.__PLAYOUT_LIMIT, self.__TIME_LIMIT, self.__NUMBER_WORKERS) + self.__tree_parameters + (
+            self.__IS_REUSE_TREE,)
+
+    # pickle only the parameters (the process pool and the tree are not sent)
+    def __getstate__(self):
+        return self.__get_parameters()
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @property
+    def need_update_signal(self):
+        return self.__IS_REUSE_TREE and self.__NUMBER_WORKERS == 1
+
+    # the worker processes clear the trees of the previous game
+    @property
+    def need_game_end_signal(self):
+        return self.need_update_signal or self.__NUMBER_WORKERS > 1
+
+    # follow the reply of the opponent in the tree
+    def receive_update_signal(self):
+        if self.__IS_REUSE_TREE:
+            self.__tree.advance(*self.belong_game_board.get_bits(1))
+
+    def receive_game_end_signal(self):
+        self.__tree.clear()
+        self.__game_number += 1
+
+    def __search_parallel(self, player, opponent):
+        if self.__executor is None:
+            self.__executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.__NUMBER_WORKERS,
+                initializer=_init_mcts_worker,
+                initargs=(self.__tree_parameters,)
+            )
+        playout_limit = None
+        if self.__PLAYOUT_LIMIT is not None:
+            playout_limit = -(-self.__PLAYOUT_LIMIT // self.__NUMBER_WORKERS)
+        waiting_queue = [
+            self.__executor.submit(_mcts_search, self.__game_number, self.agent_number, player, opponent,
+                                   playout_limit, self.__TIME_LIMIT, self.__IS_REUSE_TREE, random.getrandbits(32))
+            for index in range(0, self.__NUMBER_WORKERS)
+        ]
+        # process id -> root statistics (a worker may run several searches, the tree of the last one has all visits)
+        worker_statistics = {}
+        playout_count = 0
+        for end_search in concurrent.futures.as_completed(waiting_queue):
+            process_id, now_statistics, now_playout_count = end_search.result()
+            now_visits = sum(visits for visits, value_sum in now_statistics.values())
+            if process_id not in worker_statistics or worker_statistics[process_id][0] < now_visits:
+                worker_statistics[process_id] = (now_visits, now_statistics)
+            playout_count += now_playout_count
+        statistics = {}
+        for now_visits, now_statistics in worker_statistics.values():
+            for move, (visits, value_sum) in now_statistics.items():
+                merged_visits, merged_value_sum = statistics.get(move, (0, 0.0))
+                statistics[move] = (merged_visits + visits, merged_value_sum + value_sum)
+        return statistics, playout_count
+
+    def next_step(self):
+        start_time = time.perf_counter()
+        player, opponent = self.belong_game_board.get_bits(self.agent_number)
+        if self.__NUMBER_WORKERS == 1:
+            if not self.__IS_REUSE_TREE:
+                self.__tree.clear()
+            self.__tree.set_root(self.agent_number, player, opponent)
+            playout_count = self.__tree.search(self.__PLAYOUT_LIMIT, self.__TIME_LIMIT)
+            statistics = self.__tree.get_root_statistics()
+        else:
+            statistics, playout_count = self.__search_parallel(player, opponent)
+        self.__playout_count += playout_count
+        self.__search_seconds += time.perf_counter() - start_time
+        # most visits, then the best value
+        move = max(statistics, key=lambda index: (statistics[index][0], statistics[index][1]))
+        return move >> 3, move & 7
+
+    # root statistics of the last search ({move index: (visits, value sum)}, one process only)
+    def get_root_statistics(self):
+        return self.__tree.get_root_statistics()
+
+    @property
+    def playouts_per_second(self):
+        return self.__playout_count / self.__search_seconds if self.__search_seconds > 0 else 0.0
+
+    def reset_statistics(self):
+        self.__playout_count = 0
+        self.__search_seconds = 0.0
+
+    # shutdown the worker processes (owner of the agent calls after the games)
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.close()
+
+    def copy(self):
+        return MCTSAgent(*self.__get_parameters())
@@ -0,0 +1,87 @@
+import numpy as np
+
+# weight names of DQNAgent network (same order as get_weights of the Keras model)
+DQN_WEIGHT_NAMES = [
+    "now_state_conv_kernel", "now_state_conv_bias",
+    "action_state_conv_kernel", "action_state_conv_bias",
+    "first_combined_conv_kernel", "first_combined_conv_bias",
+    "second_combined_conv_kernel", "second_combined_conv_bias",
+    "dense_kernel", "dense_bias",
+]
+DQN_WEIGHT_SHAPES = [(5, 5, 1, 32), (32,), (5, 5, 1, 32), (32,), (3, 3, 64, 64), (64,), (3, 3, 64, 64), (64,),
+                     (64, 1), (1,)]
+
+
+def save_dqn_weights(file_path, weights):
+    if [tuple(np.shape(weight)) for weight in weights] != DQN_WEIGHT_SHAPES:
+        raise Exception("Weights are not the network of DQNAgent.")
+    with open(file_path, "wb") as file:
+        np.savez(file, **{
+            name: np.asarray(weight, dtype=np.float32) for name, weight in zip(DQN_WEIGHT_NAMES, weights)
+        })
+
+
+# return list of weights (same order as get_weights)
+def load_dqn_weights(file_path):
+    data = np.load(file_path)
+    return [data[name] for name in DQN_WEIGHT_NAMES]
+
+
+# Conv2D (padding "same" of TensorFlow, relu) with precomputed im2col indexes
+class Convolution2D(object):
+    def __init__(self, kernel, bias, stride, input_size):
+        kernel_size, kernel_size_w, channels, filters = kernel.shape
+        output_size = -(-input_size // stride)
+        # TensorFlow puts the odd padding on the bottom / right side
+        padding_before = max((output_size - 1) * stride + kernel_size - input_size, 0) // 2
+        output_index = np.arange(output_size) * stride - padding_before
+        rows = output_index[:, None, None, None, None] + np.arange(kernel_size)[None, None, :, None, None]
+        columns = output_index[None, :, None, None, None] + np.arange(kernel_size_w)[None, None, None, :, None]
+        channel_index = np.arange(channels)[None, None, None, None, :]
+        is_inside = (rows >= 0) & (rows < input_size) & (columns >= 0) & (columns < input_size)
+        # padding cell refers to the zero column at the end of input
+        self.__im2col_index = np.where(
+            is_inside,
+            (rows * input_size + columns) * channels + channel_index,
+            input_size * input_size * channels
+        ).reshape(output_size * output_size, kernel_size * kernel_size_w * channels)
+        self.__kernel = np.asarray(kernel, dtype=np.float32).reshape(-1, filters)
+        self.__bias = np.asarray(bias, dtype=np.float32)
+        self.__OUTPUT_SIZE = output_size
+
+    # inputs shape is (N, size, size, channels), return (N, output size, output size, filters)
+    def forward(self, inputs):
+        flatten = inputs.reshape(len(inputs), -1)
+        flatten = np.concatenate([flatten, np.zeros((len(inputs), 1), dtype=np.float32)], axis=1)
+        ret = np.matmul(flatten[:, self.__im2col_index], self.__kernel) + self.__bias
+        return np.maximum(ret, 0).reshape(len(inputs), self.__OUTPUT_SIZE, self.__OUTPUT_SIZE, -1)
+
+
+# forward propagation of DQNAgent network in float32 (no TensorFlow)
+class DQNInferenceNetwork(object):
+    def __init__(self, weights):
+        if [tuple(np.shape(weight)) for weight in weights] != DQN_WEIGHT_SHAPES:
+            raise Exception("Weights are not the network of DQNAgent.")
+        self.__now_state_conv = Convolution2D(weights[0], weights[1], 2, 8)
+        self.__action_state_conv = Convolution2D(weights[2], weights[3], 2, 8)
+        self.__first_combined_conv = Convolution2D(weights[4], weights[5], 3, 4)
+        self.__second_combined_conv = Convolution2D(weights[6], weights[7], 3, 2)
+        self.__dense_kernel = np.asarray(weights[8], dtype=np.float32)
+        self.__dense_bias = np.asarray(weights[9], dtype=np.float32)
+
+    @staticmethod
+    def load(file_path):
+        return DQNInferenceNetwork(load_dqn_weights(file_path))
+
+    # states shape is (N, 8, 8). return Q values (N,)
+    def predict(self, now_states, action_states):
+        now_states = np.asarray(now_states, dtype=np.float32).reshape(-1, 8, 8, 1)
+        action_states = np.asarray(action_states, dtype=np.float32).reshape(-1, 8, 8, 1)
+        combined_layer = np.concatenate([
+            self.__now_state_conv.forward(now_states),
+            self.__action_state_conv.forward(action_states)
+        ], axis=3)
+        combined_layer = self.__first_combined_conv.forward(combined_layer)
+        combined_layer = self.__second_combined_conv.forward(combined_layer)
+        last_layer = np.matmul(combined_layer.reshape(len(combined_layer), -1), self.__dense_kernel) + self.__dense_bias
+        return np.maximum(last_layer, 0).reshape(-1)
@@ -0,0 +1,179 @@
+import collections
+import numpy as np
+import agent
+import bit_board
+import game_board
+import headless_runner
+import symmetry
+import transposition_table
+
+# one entry is one move of one position (sorted by key). move is cell index of canonical board
+BOOK_DTYPE = np.dtype([
+    ("key", np.uint64),
+    ("move", np.int8),
+    ("stones", np.uint8),
+    ("games", np.uint32),
+    ("wins", np.uint32),
+    ("draws", np.uint32),
+])
+
+
+# return (key, symmetry). key is Zobrist hash of canonical board and turn
+def calc_book_key(agent_number, custom_reversi_board):
+    canonical_board, now_symmetry = symmetry.canonicalize(custom_reversi_board)
+    black_bits, white_bits = bit_board.from_reversi_board(1, canonical_board)
+    key = transposition_table.calc_zobrist_hash(black_bits, white_bits)
+    if agent_number == 1:
+        key ^= transposition_table.ZOBRIST_TURN_KEY
+    return key, now_symmetry
+
+
+# Aggregate move statistics of games (the first max_ply plies)
+class OpeningBookBuilder(object):
+    def __init__(self, max_ply=14):
+        self.__MAX_PLY = max_ply
+        # (key, move) -> [stones, games, wins, draws] (wins of the agent who moved)
+        self.__statistics = collections.defaultdict(lambda: [0, 0, 0, 0])
+        self.__number_games = 0
+
+    # moves: cell index of each ply (-1 is pass), winner: -1, 1 or 2 (draw)
+    def add_game(self, moves, first_turn_agent_number, winner):
+        search_board = game_board.SearchBoard(game_board.SearchBoard.get_initial_reversi_board())
+        turn_agent_number = first_turn_agent_number
+        for move in list(moves)[:self.__MAX_PLY]:
+            move = int(move)
+            if move != -1:
+                key, now_symmetry = calc_book_key(turn_agent_number, search_board.reversi_board)
+                vertical_index, horizontal_index = symmetry.canonicalize_cell(move >> 3, move & 7, now_symmetry)
+                record = self.__statistics[(key, vertical_index * 8 + horizontal_index)]
+                record[0] = search_board.count_stones(-1) + search_board.count_stones(1)
+                record[1] += 1
+                if winner == turn_agent_number:
+                    record[2] += 1
+                elif winner == 2:
+                    record[3] += 1
+                search_board.make_move(move >> 3, move & 7, turn_agent_number)
+            turn_agent_number *= -1
+        self.__number_games += 1
+
+    # game_records: list of headless_runner.GameRecord
+    def add_records(self, game_records):
+        for game_record in game_records:
+            self.add_game(game_record.moves, game_record.first_turn_agent_number, game_record.winner)
+
+    def play_games(self, times, first_agent, second_agent):
+        self.add_records(headless_runner.play_games(times, first_agent, second_agent))
+
+    def merge(self, builder):
+        for (key, move), (stones, games, wins, draws) in builder.__statistics.items():
+            record = self.__statistics[(key, move)]
+            record[0] = stones
+            record[1] += games
+            record[2] += wins
+            record[3] += draws
+        self.__number_games += builder.__number_games
+
+    # moves played less than min_games are not written
+    def write(self, file_path, min_games=1):
+        entries = np.array(
+            [
+                (key, move, stones, games, wins, draws)
+                for (key, move), (stones, games, wins, draws) in self.__statistics.items()
+                if games >= min_games
+            ],
+            dtype=BOOK_DTYPE
+        )
+        entries = entries[np.argsort(entries["key"], kind="stable")]
+        with open(file_path, "wb") as file:
+            np.save(file, entries)
+
+    @property
+    def number_games(self):
+        return self.__number_games
+
+    def __len__(self):
+        return len(self.__statistics)
+
+
+# Memory-mapped book (read only, the pages are shared by every process)
+class OpeningBook(object):
+    def __init__(self, file_path):
+        self.__file_path = file_path
+        self.__entries = np.load(file_path, mmap_mode="r")
+        if self.__entries.dtype != BOOK_DTYPE:
+            raise Exception("The file is not an opening book.")
+        self.__keys = self.__entries["key"]
+        self.__max_stones = int(self.__entries["stones"].max()) if len(self.__entries) != 0 else 0
+
+    # pickle only the file path (worker processes map the same file)
+    def __getstate__(self):
+        return self.__file_path
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    # return list of ((vertical index, horizontal index), games, wins, draws)
+    def get_moves(self, agent_number, custom_reversi_board):
+        key, now_symmetry = calc_book_key(agent_number, custom_reversi_board)
+        start = np.searchsorted(self.__keys, np.uint64(key), side="left")
+        end = np.searchsorted(self.__keys, np.uint64(key), side="right")
+        ret = []
+        for entry in self.__entries[start:end]:
+            move = int(entry["move"])
+            ret.append((
+                symmetry.from_canonical_cell(move >> 3, move & 7, now_symmetry),
+                int(entry["games"]),
+                int(entry["wins"]),
+                int(entry["draws"])
+            ))
+        return ret
+
+    # the best winning rate (draw is half win) move of min_games or more games, None if out of book
+    def select_move(self, agent_number, custom_reversi_board, min_games=1):
+        ret = None
+        best_score = None
+        for cell, games, wins, draws in self.get_moves(agent_number, custom_reversi_board):
+            if games < min_games:
+                continue
+            score = ((wins + 0.5 * draws) / games, games)
+            if best_score is None or best_score < score:
+                ret = cell
+                best_score = score
+        return ret
+
+    # stones of the last book position
+    @property
+    def max_stones(self):
+        return self.__max_stones
+
+    @property
+    def file_path(self):
+        return self.__file_path
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+# Agent wrapper, play the book move if there is, else the move of the wrapped agent
+class BookAgent(agent.WrapperAgent):
+    def __init__(self, wrapped_agent, book, min_games=1):
+        super().__init__("Book", wrapped_agent)
+        self.__book = book
+        self.__MIN_GAMES = min_games
+        self.__book_move_count = 0
+
+    def next_step(self):
+        board = self.belong_game_board
+        if board.count_stones(-1) + board.count_stones(1) <= self.__book.max_stones:
+            ret = self.__book.select_move(self.agent_number, board.reversi_board, self.__MIN_GAMES)
+            if ret is not None:
+                self.__book_move_count += 1
+                return ret
+        return self.wrapped_agent.next_step()
+
+    @property
+    def book_move_count(self):
+        return self.__book_move_count
+
+    def copy(self):
+        return BookAgent(self.wrapped_agent.copy(), self.__book, self.__MIN_GAMES)
@@ -0,0 +1,133 @@
+import argparse
+import concurrent.futures
+import sys
+import time
+import numpy as np
+import bit_board
+import game_board
+
+# leaf nodes from the initial position (black first, pass is one ply)
+KNOWN_PERFT_COUNTS = {
+    1: 4,
+    2: 12,
+    3: 56,
+    4: 244,
+    5: 1396,
+    6: 8200,
+    7: 55092,
+    8: 390216,
+    9: 3005288,
+    10: 24571284,
+    11: 212258800,
+    12: 1939886636,
+    13: 18429641748,
+    14: 184042084512,
+}
+ENGINES = ["bit_board", "game_board"]
+
+
+# the end of game is one leaf
+def perft_bits(player, opponent, depth):
+    if depth == 0:
+        return 1
+    moves_bits = bit_board.get_moves(player, opponent)
+    if moves_bits == 0:
+        if not bit_board.has_moves(opponent, player):
+            return 1
+        return perft_bits(opponent, player, depth - 1)
+    if depth == 1:
+        return bit_board.count_bits(moves_bits)
+    ret = 0
+    for index in bit_board.to_indexes(moves_bits):
+        flips = bit_board.get_flips(index, player, opponent)
+        ret += perft_bits(opponent & ~flips, player | flips | (1 << index), depth - 1)
+    return ret
+
+
+# same as perft_bits with GameBoard static method (validate put / undo of custom board)
+def perft_custom_board(agent_number, custom_reversi_board, depth):
+    if depth == 0:
+        return 1
+    selectable_cells = game_board.GameBoard.get_selectable_cells_custom_board(agent_number, custom_reversi_board)
+    if len(selectable_cells) == 0:
+        enemy_selectable_cells = game_board.GameBoard.get_selectable_cells_custom_board(
+            agent_number * -1,
+            custom_reversi_board
+        )
+        if len(enemy_selectable_cells) == 0:
+            return 1
+        return perft_custom_board(agent_number * -1, custom_reversi_board, depth - 1)
+    ret = 0
+    for cell in selectable_cells:
+        change_cells = game_board.GameBoard.put_stone_custom_board(
+            cell[0],
+            cell[1],
+            agent_number,
+            custom_reversi_board
+        )
+        ret += perft_custom_board(agent_number * -1, custom_reversi_board, depth - 1)
+        game_board.GameBoard.undo_put_stone_custom_board(change_cells, custom_reversi_board)
+    return ret
+
+
+def _perft_task(engine, agent_number, custom_reversi_board, depth):
+    if engine == "bit_board":
+        player, opponent = bit_board.from_reversi_board(agent_number, custom_reversi_board)
+        return perft_bits(player, opponent, depth)
+    return perft_custom_board(agent_number, np.copy(custom_reversi_board), depth)
+
+
+# split root moves to process pool. return (nodes, seconds)
+def perft(depth, agent_number=1, custom_reversi_board=None, engine="bit_board", max_workers=None):
+    if engine not in ENGINES:
+        raise Exception("Select engine from " + str(ENGINES))
+    if custom_reversi_board is None:
+        custom_reversi_board = game_board.SearchBoard.get_initial_reversi_board()
+    start_time = time.perf_counter()
+    selectable_cells = game_board.GameBoard.get_selectable_cells_custom_board(agent_number, custom_reversi_board)
+    if depth <= 1 or len(selectable_cells) == 0:
+        return _perft_task(engine, agent_number, custom_reversi_board, depth), time.perf_counter() - start_time
+    ret = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        waiting_queue = []
+        for cell in selectable_cells:
+            next_reversi_board = np.copy(custom_reversi_board)
+            game_board.GameBoard.put_stone_custom_board(cell[0], cell[1], agent_number, next_reversi_board)
+            waiting_queue.append(executor.submit(
+                _perft_task,
+                engine,
+                agent_number * -1,
+                next_reversi_board,
+                depth - 1
+            ))
+        for end_task in concurrent.futures.as_completed(waiting_queue):
+            ret += end_task.result()
+    return ret, time.perf_counter() - start_time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft of reversi move generator.")
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--engine", choices=ENGINES, default="bit_board")
+    parser.add_argument("--board", default=None, help="npy file of 8x8 reversi board (default is initial position)")
+    parser.add_argument("--agent-number", type=int, default=1, help="turn agent number (-1: white, 1: black)")
+    args = parser.parse_args(argv)
+    custom_reversi_board = None if args.board is None else np.load(args.board)
+    is_initial = custom_reversi_board is None and args.agent_number == 1
+    exit_code = 0
+    for depth in range(1, args.depth + 1):
+        nodes, seconds = perft(depth, args.agent_number, custom_reversi_board, args.engine, args.workers)
+        message = "depth %d: %d nodes, %.3f s, %.0f nodes/s" % (depth, nodes, seconds, nodes / max(seconds, 1e-9))
+        if is_initial and depth in KNOWN_PERFT_COUNTS:
+            if KNOWN_PERFT_COUNTS[depth] == nodes:
+                message += " (ok)"
+            else:
+                message += " (NG, expected %d)" % KNOWN_PERFT_COUNTS[depth]
+                exit_code = 1
+        print(message)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
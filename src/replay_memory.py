@@ -0,0 +1,232 @@
+import numpy as np
+
+
+# Ring buffer of transitions (now state, action state, target value) for DQN
+# states are int8 (white = -1, nothing = 0, black = 1). file_path is not None: spill to memory-mapped files
+class ReplayMemory(object):
+    def __init__(self, capacity, file_path=None):
+        if capacity <= 0:
+            raise Exception("Capacity of ReplayMemory must be positive.")
+        self.__CAPACITY = capacity
+        self.__file_path = file_path
+        self.__now_states = self.__allocate("now_states", (capacity, 8, 8), np.int8)
+        self.__action_states = self.__allocate("action_states", (capacity, 8, 8), np.int8)
+        self.__values = self.__allocate("values", (capacity,), np.float32)
+        self.__position = 0
+        self.__size = 0
+
+    def __allocate(self, name, shape, dtype):
+        if self.__file_path is None:
+            return np.zeros(shape, dtype=dtype)
+        return np.lib.format.open_memmap(self.__file_path + "." + name + ".npy", mode="w+", dtype=dtype, shape=shape)
+
+    # return the index of stored transition (the oldest one is overwritten when it is full)
+    def add(self, now_state, action_state, value):
+        index = self.__position
+        self.__now_states[index] = now_state
+        self.__action_states[index] = action_state
+        self.__values[index] = value
+        self.__position = (self.__position + 1) % self.__CAPACITY
+        self.__size = min(self.__size + 1, self.__CAPACITY)
+        return index
+
+    # return indexes of stored transitions
+    def add_batch(self, now_states, action_states, values):
+        values = np.asarray(values).reshape(-1)
+        # only the last capacity transitions remain
+        start = max(0, len(values) - self.__CAPACITY)
+        indexes = (self.__position + np.arange(len(values) - start)) % self.__CAPACITY
+        self.__now_states[indexes] = np.asarray(now_states)[start:]
+        self.__action_states[indexes] = np.asarray(action_states)[start:]
+        self.__values[indexes] = values[start:]
+        self.__position = (self.__position + len(indexes)) % self.__CAPACITY
+        self.__size = min(self.__size + len(indexes), self.__CAPACITY)
+        return indexes
+
+    # return ([now state batch, action state batch], value batch) as float32
+    def get_batch(self, indexes):
+        return (
+            [self.__now_states[indexes].astype(np.float32), self.__action_states[indexes].astype(np.float32)],
+            self.__values[indexes].astype(np.float32)
+        )
+
+    # uniform sampling with replacement. return (indexes, state batch, value batch)
+    def sample(self, batch_size):
+        if self.__size == 0:
+            raise Exception("ReplayMemory is empty.")
+        indexes = np.random.randint(0, self.__size, batch_size)
+        return (indexes,) + self.get_batch(indexes)
+
+    def flush(self):
+        if self.__file_path is not None:
+            for array in [self.__now_states, self.__action_states, self.__values]:
+                array.flush()
+
+    def clear(self):
+        self.__position = 0
+        self.__size = 0
+
+    @property
+    def capacity(self):
+        return self.__CAPACITY
+
+    @property
+    def file_path(self):
+        return self.__file_path
+
+    @property
+    def memory_bytes(self):
+        return self.__now_states.nbytes + self.__action_states.nbytes + self.__values.nbytes
+
+    def __len__(self):
+        return self.__size
+
+
+# Binary tree of priorities (parent is sum of children). leaves are padded to power of 2
+class SumTree(object):
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise Exception("Capacity of SumTree must be positive.")
+        self.__CAPACITY = capacity
+        self.__LEAF_OFFSET = 1 << max(0, int(capacity - 1).bit_length())
+        self.__tree = np.zeros(2 * self.__LEAF_OFFSET)
+
+    def update(self, indexes, priorities):
+        tree_indexes = np.asarray(indexes, dtype=np.int64).reshape(-1) + self.__LEAF_OFFSET
+        if len(tree_indexes) == 0:
+            return
+        self.__tree[tree_indexes] = priorities
+        # recalculate the parents of each level
+        while tree_indexes[0] > 1:
+            tree_indexes = np.unique(tree_indexes // 2)
+            self.__tree[tree_indexes] = self.__tree[2 * tree_indexes] + self.__tree[2 * tree_indexes + 1]
+
+    def get(self, indexes):
+        return self.__tree[np.asarray(indexes, dtype=np.int64) + self.__LEAF_OFFSET]
+
+    # return leaf indexes of prefix sum values (vectorized descent)
+    def find(self, values):
+        values = np.array(values, dtype=np.float64).reshape(-1)
+        tree_indexes = np.ones(len(values), dtype=np.int64)
+        while tree_indexes[0] < self.__LEAF_OFFSET:
+            left_indexes = 2 * tree_indexes
+            left_values = self.__tree[left_indexes]
+            is_right = values >= left_values
+            values -= np.where(is_right, left_values, 0.0)
+            tree_indexes = left_indexes + is_right
+        return np.minimum(tree_indexes - self.__LEAF_OFFSET, self.__CAPACITY - 1)
+
+    @property
+    def total(self):
+        return float(self.__tree[1])
+
+    @property
+    def capacity(self):
+        return self.__CAPACITY
+
+
+# Proportional prioritized experience replay (priority = (|td error| + epsilon) ^ alpha)
+class PrioritizedReplayMemory(ReplayMemory):
+    def __init__(self, capacity, alpha=0.6, beta=0.4, epsilon=0.01, file_path=None):
+        super().__init__(capacity, file_path)
+        self.__ALPHA = alpha
+        self.__EPSILON = epsilon
+        self.__beta = beta
+        self.__sum_tree = SumTree(capacity)
+        self.__max_priority = 1.0
+
+    # new transition has max priority (sampled at least once)
+    def add(self, now_state, action_state, value):
+        index = super().add(now_state, action_state, value)
+        self.__sum_tree.update([index], [self.__max_priority])
+        return index
+
+    def add_batch(self, now_states, action_states, values):
+        indexes = super().add_batch(now_states, action_states, values)
+        self.__sum_tree.update(indexes, np.full(len(indexes), self.__max_priority))
+        return indexes
+
+    # return (indexes, state batch, value batch, importance sampling weights)
+    def sample(self, batch_size):
+        if len(self) == 0:
+            raise Exception("ReplayMemory is empty.")
+        total = self.__sum_tree.total
+        # stratified sampling of prefix sum
+        values = (np.arange(batch_size) + np.random.rand(batch_size)) * (total / batch_size)
+        indexes = np.minimum(self.__sum_tree.find(values), len(self) - 1)
+        probabilities = self.__sum_tree.get(indexes) / total
+        weights = (len(self) * probabilities) ** -self.__beta
+        weights /= weights.max()
+        return (indexes,) + self.get_batch(indexes) + (weights.astype(np.float32),)
+
+    def update_priorities(self, indexes, td_errors):
+        priorities = (np.abs(np.asarray(td_errors, dtype=np.float64)).reshape(-1) + self.__EPSILON) ** self.__ALPHA
+        self.__sum_tree.update(indexes, priorities)
+        self.__max_priority = max(self.__max_priority, float(priorities.max()))
+
+    def clear(self):
+        super().clear()
+        self.__sum_tree = SumTree(self.capacity)
+        self.__max_priority = 1.0
+
+    @property
+    def beta(self):
+        return self.__beta
+
+    # annealing of importance sampling (to 1 at the end of learning)
+    @beta.setter
+    def beta(self, value):
+        self.__beta = value
+
+
+# Memory of actor process, send transitions to the learner process in chunks
+# message is ("transitions", now states, action states, values)
+class TransitionSender(object):
+    def __init__(self, transition_queue, chunk_size=256):
+        self.__transition_queue = transition_queue
+        self.__CHUNK_SIZE = chunk_size
+        self.__now_states = np.zeros((chunk_size, 8, 8), dtype=np.int8)
+        self.__action_states = np.zeros((chunk_size, 8, 8), dtype=np.int8)
+        self.__values = np.zeros(chunk_size, dtype=np.float32)
+        self.__size = 0
+
+    def add(self, now_state, action_state, value):
+        self.__now_states[self.__size] = now_state
+        self.__action_states[self.__size] = action_state
+        self.__values[self.__size] = value
+        self.__size += 1
+        if self.__size == self.__CHUNK_SIZE:
+            self.flush()
+        return -1
+
+    def add_batch(self, now_states, action_states, values):
+        now_states = np.asarray(now_states)
+        action_states = np.asarray(action_states)
+        values = np.asarray(values).reshape(-1)
+        start = 0
+        while start < len(values):
+            # fill the rest of the chunk at once
+            end = min(len(values), start + self.__CHUNK_SIZE - self.__size)
+            self.__now_states[self.__size:self.__size + end - start] = now_states[start:end]
+            self.__action_states[self.__size:self.__size + end - start] = action_states[start:end]
+            self.__values[self.__size:self.__size + end - start] = values[start:end]
+            self.__size += end - start
+            if self.__size == self.__CHUNK_SIZE:
+                self.flush()
+            start = end
+        return np.full(len(values), -1)
+
+    def flush(self):
+        if self.__size == 0:
+            return
+        self.__transition_queue.put((
+            "transitions",
+            self.__now_states[:self.__size].copy(),
+            self.__action_states[:self.__size].copy(),
+            self.__values[:self.__size].copy()
+        ))
+        self.__size = 0
+
+    # number of transitions not sent
+    def __len__(self):
+        return self.__size
@@ -0,0 +1,131 @@
+import collections
+import numpy as np
+import bit_board
+
+# 8 symmetries of the board (dihedral group). SYMMETRY_INDEXES[symmetry][cell index] is the original cell index
+# (transformed flatten board = flatten board[SYMMETRY_INDEXES[symmetry]])
+_BOARD_INDEXES = np.arange(64).reshape(8, 8)
+SYMMETRY_INDEXES = np.array([
+    _BOARD_INDEXES,
+    np.rot90(_BOARD_INDEXES, 1),
+    np.rot90(_BOARD_INDEXES, 2),
+    np.rot90(_BOARD_INDEXES, 3),
+    _BOARD_INDEXES.T,
+    np.flipud(_BOARD_INDEXES),
+    np.fliplr(_BOARD_INDEXES),
+    np.rot90(_BOARD_INDEXES, 2).T,
+]).reshape(8, 64)
+NUMBER_SYMMETRIES = len(SYMMETRY_INDEXES)
+# INVERSE_SYMMETRY_INDEXES[symmetry][original cell index] is the transformed cell index
+INVERSE_SYMMETRY_INDEXES = np.argsort(SYMMETRY_INDEXES, axis=1)
+
+
+def transform_board(custom_reversi_board, symmetry):
+    return np.asarray(custom_reversi_board).reshape(64)[SYMMETRY_INDEXES[symmetry]].reshape(8, 8)
+
+
+def transform_cell(vertical_index, horizontal_index, symmetry):
+    index = int(INVERSE_SYMMETRY_INDEXES[symmetry][vertical_index * 8 + horizontal_index])
+    return index >> 3, index & 7
+
+
+def inverse_transform_cell(vertical_index, horizontal_index, symmetry):
+    index = int(SYMMETRY_INDEXES[symmetry][vertical_index * 8 + horizontal_index])
+    return index >> 3, index & 7
+
+
+# return (canonical board, symmetry). canonical board is the minimum (black bits, white bits) of 8 symmetries
+def canonicalize(custom_reversi_board):
+    canonical_boards, symmetries = canonicalize_batch(np.asarray(custom_reversi_board).reshape(1, 8, 8))
+    return canonical_boards[0], int(symmetries[0])
+
+
+# custom_reversi_boards shape is (N, 8, 8). return (canonical boards, symmetries)
+def canonicalize_batch(custom_reversi_boards):
+    flatten = np.asarray(custom_reversi_boards).reshape(-1, 64)
+    # (N, 8, 64) all symmetries
+    transformed = flatten[:, SYMMETRY_INDEXES]
+    black, white = bit_board.from_reversi_board_array(1, transformed.reshape(-1, 64))
+    black = black.reshape(-1, NUMBER_SYMMETRIES)
+    white = white.reshape(-1, NUMBER_SYMMETRIES)
+    is_min_black = black == black.min(axis=1, keepdims=True)
+    symmetries = np.argmin(np.where(is_min_black, white, np.uint64(bit_board.FULL_MASK)), axis=1)
+    canonical_boards = transformed[np.arange(len(flatten)), symmetries].reshape(-1, 8, 8)
+    return canonical_boards, symmetries
+
+
+def canonicalize_cell(vertical_index, horizontal_index, symmetry):
+    return transform_cell(vertical_index, horizontal_index, symmetry)
+
+
+# move of canonical board -> move of the original board
+def from_canonical_cell(vertical_index, horizontal_index, symmetry):
+    return inverse_transform_cell(vertical_index, horizontal_index, symmetry)
+
+
+# return (black bits, white bits) of canonical board
+def canonical_key(custom_reversi_board):
+    canonical_board, symmetry = canonicalize(custom_reversi_board)
+    return bit_board.from_reversi_board(1, canonical_board)
+
+
+# expand transitions eightfold (states shape is (N, 8, 8)), return (now states, action states, values)
+def augment_transitions(now_states, action_states, values):
+    now_states = np.asarray(now_states)
+    action_states = np.asarray(action_states)
+    return (
+        now_states.reshape(-1, 64)[:, SYMMETRY_INDEXES].reshape(-1, 8, 8),
+        action_states.reshape(-1, 64)[:, SYMMETRY_INDEXES].reshape(-1, 8, 8),
+        np.repeat(np.asarray(values).reshape(-1), NUMBER_SYMMETRIES)
+    )
+
+
+# Evaluation cache keyed by canonical position, LRU bounded
+# the value is exact for symmetric evaluators (stone difference, NNGA features, etc.)
+class SymmetricEvaluationCache(object):
+    def __init__(self, max_size=100000):
+        if max_size <= 0:
+            raise Exception("Size of SymmetricEvaluationCache must be positive.")
+        self.__MAX_SIZE = max_size
+        self.__records = collections.OrderedDict()
+        self.__hit_count = 0
+        self.__miss_count = 0
+
+    @staticmethod
+    def __get_key(agent_number, custom_reversi_board):
+        return canonical_key(custom_reversi_board) + (agent_number,)
+
+    # evaluator(agent_number, custom_reversi_board)
+    def evaluate(self, agent_number, custom_reversi_board, evaluator):
+        key = self.__get_key(agent_number, custom_reversi_board)
+        if key in self.__records:
+            self.__hit_count += 1
+            self.__records.move_to_end(key)
+            return self.__records[key]
+        self.__miss_count += 1
+        ret = evaluator(agent_number, custom_reversi_board)
+        self.__records[key] = ret
+        if len(self.__records) > self.__MAX_SIZE:
+            self.__records.popitem(last=False)
+        return ret
+
+    # evaluator with this cache (for AlphaBetaAgent etc.)
+    def wrap(self, evaluator):
+        def cached_evaluator(agent_number, custom_reversi_board):
+            return self.evaluate(agent_number, custom_reversi_board, evaluator)
+
+        return cached_evaluator
+
+    def clear(self):
+        self.__records.clear()
+        self.__hit_count = 0
+        self.__miss_count = 0
+
+    def __len__(self):
+        return len(self.__records)
+
+    @property
+    def hit_rate(self):
+        if self.__hit_count + self.__miss_count == 0:
+            return 0.0
+        return self.__hit_count / (self.__hit_count + self.__miss_count)
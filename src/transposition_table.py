@@ -0,0 +1,130 @@
+import numpy as np
+import bit_board
+
+# fixed seed, the same position has the same hash in every process
+_random_state = np.random.RandomState(20200101)
+# ZOBRIST_KEYS[agent_number][cell index] (agent_number -1 or 1)
+ZOBRIST_KEYS = {
+    -1: [int(value) for value in _random_state.randint(1, 2 ** 64, 64, dtype=np.uint64)],
+    1: [int(value) for value in _random_state.randint(1, 2 ** 64, 64, dtype=np.uint64)],
+}
+# xor when the turn is black (1)
+ZOBRIST_TURN_KEY = int(_random_state.randint(1, 2 ** 64, dtype=np.uint64))
+
+
+def calc_zobrist_hash(black_bits, white_bits):
+    ret = 0
+    for index in bit_board.to_indexes(black_bits):
+        ret ^= ZOBRIST_KEYS[1][index]
+    for index in bit_board.to_indexes(white_bits):
+        ret ^= ZOBRIST_KEYS[-1][index]
+    return ret
+
+
+# same operation for put and undo. flip_bits are the reversed stones (not include put cell)
+def update_zobrist_hash(zobrist_hash, put_index, flip_bits, agent_number):
+    zobrist_hash ^= ZOBRIST_KEYS[agent_number][put_index]
+    for index in bit_board.to_indexes(flip_bits):
+        zobrist_hash ^= ZOBRIST_KEYS[agent_number][index] ^ ZOBRIST_KEYS[-agent_number][index]
+    return zobrist_hash
+
+
+# Fixed memory hash table. replacement policy is "always" or "depth" (keep deeper entry)
+class TranspositionTable(object):
+    # flag of stored value (for alpha-beta search)
+    EXACT = 0
+    LOWER_BOUND = 1
+    UPPER_BOUND = 2
+
+    def __init__(self, size=2 ** 20, replacement_policy="depth"):
+        if size <= 0:
+            raise Exception("Size of TranspositionTable must be positive.")
+        if replacement_policy not in ["always", "depth"]:
+            raise Exception("Select 'always' or 'depth' for replacement policy.")
+        self.__SIZE = size
+        self.__REPLACEMENT_POLICY = replacement_policy
+        self.__keys = np.zeros(size, dtype=np.uint64)
+        self.__values = np.zeros(size, dtype=np.float64)
+        self.__depths = np.zeros(size, dtype=np.int16)
+        self.__flags = np.zeros(size, dtype=np.int8)
+        self.__best_moves = np.full(size, -1, dtype=np.int8)
+        self.__is_used = np.zeros(size, dtype=bool)
+        self.__probe_count = 0
+        self.__hit_count = 0
+        self.__store_count = 0
+        self.__replace_count = 0
+
+    def __get_slot(self, key):
+        return key % self.__SIZE
+
+    # return (value, depth, flag, best move index) or None
+    def probe(self, key):
+        self.__probe_count += 1
+        slot = self.__get_slot(key)
+        if not self.__is_used[slot] or int(self.__keys[slot]) != key:
+            return None
+        self.__hit_count += 1
+        return (
+            float(self.__values[slot]),
+            int(self.__depths[slot]),
+            int(self.__flags[slot]),
+            int(self.__best_moves[slot])
+        )
+
+    def store(self, key, value, depth=0, flag=EXACT, best_move=-1):
+        slot = self.__get_slot(key)
+        if self.__is_used[slot]:
+            is_same_key = int(self.__keys[slot]) == key
+            if self.__REPLACEMENT_POLICY == "depth" and not is_same_key and self.__depths[slot] > depth:
+                return False
+            if not is_same_key:
+                self.__replace_count += 1
+        self.__store_count += 1
+        self.__keys[slot] = key
+        self.__values[slot] = value
+        self.__depths[slot] = depth
+        self.__flags[slot] = flag
+        self.__best_moves[slot] = best_move
+        self.__is_used[slot] = True
+        return True
+
+    def clear(self):
+        self.__is_used.fill(False)
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self.__probe_count = 0
+        self.__hit_count = 0
+        self.__store_count = 0
+        self.__replace_count = 0
+
+    @property
+    def size(self):
+        return self.__SIZE
+
+    @property
+    def hit_rate(self):
+        if self.__probe_count == 0:
+            return 0.0
+        return self.__hit_count / self.__probe_count
+
+    @property
+    def fill_rate(self):
+        return float(np.count_nonzero(self.__is_used)) / self.__SIZE
+
+    @property
+    def memory_bytes(self):
+        return (self.__keys.nbytes + self.__values.nbytes + self.__depths.nbytes + self.__flags.nbytes
+                + self.__best_moves.nbytes + self.__is_used.nbytes)
+
+    def get_statistics(self):
+        return {
+            "size": self.__SIZE,
+            "memory_bytes": self.memory_bytes,
+            "probe": self.__probe_count,
+            "hit": self.__hit_count,
+            "hit_rate": self.hit_rate,
+            "store": self.__store_count,
+            "replace": self.__replace_count,
+            "fill_rate": self.fill_rate,
+        }